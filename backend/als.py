@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import numpy as np
+from diversity import top_positions
+from precompute import publish
+
+
+ALS_FACTORS = int(os.getenv("ALS_FACTORS", 32))
+ALS_REGULARIZATION = float(os.getenv("ALS_REGULARIZATION", 0.1))
+ALS_ITERATIONS = int(os.getenv("ALS_ITERATIONS", 10))
+
+# Confidence of a (user, car) cell is 1 + ALS_ALPHA * its weighted
+# interaction total (see ACTION_WEIGHTS in interactions.py).
+ALS_ALPHA = float(os.getenv("ALS_ALPHA", 2.0))
+
+# Training is an offline step: python als.py once (e.g. from cron), or
+# python als.py --every SECONDS as its own long-running process. Workers
+# only map the factors it publishes here and look for a newer build at
+# most every ALS_RELOAD_INTERVAL seconds.
+ALS_DIR = os.getenv(
+    "ALS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "als")
+)
+
+ALS_RELOAD_INTERVAL = float(os.getenv("ALS_RELOAD_INTERVAL", 30))
+
+# Default for --every; 0 trains once and exits.
+ALS_RETRAIN_INTERVAL = float(os.getenv("ALS_RETRAIN_INTERVAL", 0))
+
+logger = logging.getLogger(__name__)
+
+
+def solve_side(confidence, fixed, regularization):
+
+    # One half-step of implicit ALS (Hu, Koren & Volinsky): every row of
+    # confidence gets the factors that best explain its preferences given
+    # the other side's fixed factors. Cells without interactions have
+    # confidence 1 and preference 0, which YtY covers for all of them.
+    factors = fixed.shape[1]
+
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+
+    solved = np.zeros((confidence.shape[0], factors))
+
+    for row in range(confidence.shape[0]):
+
+        start, stop = confidence.indptr[row], confidence.indptr[row + 1]
+
+        if start == stop:
+            continue
+
+        items = fixed[confidence.indices[start:stop]]
+        conf = confidence.data[start:stop]
+
+        a = gram + (items.T * (conf - 1)) @ items
+        b = items.T @ conf
+
+        solved[row] = np.linalg.solve(a, b)
+
+    return solved
+
+
+def implicit_als(
+    weights,
+    factors=ALS_FACTORS,
+    regularization=ALS_REGULARIZATION,
+    iterations=ALS_ITERATIONS,
+    alpha=ALS_ALPHA,
+    seed=0
+):
+
+    confidence = weights.tocsr().astype(np.float64)
+    confidence.data = 1 + alpha * confidence.data
+
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+
+    user_factors = np.zeros((confidence.shape[0], factors))
+    item_factors = rng.normal(scale=0.01, size=(confidence.shape[1], factors))
+
+    for _ in range(iterations):
+        user_factors = solve_side(confidence, item_factors, regularization)
+        item_factors = solve_side(confidence_t, user_factors, regularization)
+
+    return user_factors, item_factors
+
+
+class ALSModel:
+
+    # seen_indptr/seen_indices are the CSR structure of the training
+    # matrix: the cars each user has already interacted with.
+    def __init__(self, users, cars, seen_indptr, seen_indices, user_factors, item_factors, trained_at=None):
+
+        self.users = users
+        self.user_index = {user: i for i, user in enumerate(users)}
+        self.cars = cars
+
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+
+        self.trained_at = trained_at or time.time()
+
+    def recommend(self, user_id, top_n=3):
+
+        user_pos = self.user_index.get(str(user_id))
+
+        if user_pos is None:
+            return None
+
+        scores = self.item_factors @ self.user_factors[user_pos]
+
+        # Never recommend a car the user has already interacted with.
+        seen = self.seen_indices[self.seen_indptr[user_pos]:self.seen_indptr[user_pos + 1]]
+        scores[seen] = -np.inf
+
+        positions = top_positions(scores, top_n)
+        positions = positions[np.isfinite(scores[positions])]
+
+        return [
+            (self.cars[pos], float(scores[pos]))
+            for pos in positions.tolist()
+        ]
+
+
+ARRAYS = ["user_factors", "item_factors", "seen_indptr", "seen_indices"]
+
+
+def save_model(model, path=ALS_DIR):
+
+    # Same publish step as the precomputed CBF results: workers may have
+    # the current factors mapped, so a new build never overwrites them.
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+
+    tmp = tempfile.mkdtemp(dir=parent)
+
+    try:
+
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(model, name)))
+
+        with open(os.path.join(tmp, "model.json"), "w") as f:
+            json.dump({
+                "users": list(model.users),
+                "cars": list(model.cars),
+                "trained_at": model.trained_at
+            }, f)
+
+        publish(tmp, path)
+
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_model(path=ALS_DIR):
+
+    try:
+
+        with open(os.path.join(path, "model.json")) as f:
+            meta = json.load(f)
+
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ARRAYS
+        }
+
+    except (OSError, ValueError):
+        # Not built yet, or caught between the renames in publish().
+        return None
+
+    users, cars = meta["users"], meta["cars"]
+
+    if (
+        arrays["user_factors"].shape[0] != len(users) or
+        arrays["item_factors"].shape[0] != len(cars) or
+        arrays["seen_indptr"].shape[0] != len(users) + 1
+    ):
+        logger.warning("Ignoring ALS factors replaced while loading")
+        return None
+
+    return ALSModel(users, cars, trained_at=meta["trained_at"], **arrays)
+
+
+def train(source):
+
+    source.refresh(force=True)
+
+    # One state read is consistent: rows or columns added after its
+    # matrix are ignored.
+    state = source.state
+    weights = state.weighted.tocsr()
+
+    if weights.nnz == 0:
+        return None
+
+    user_factors, item_factors = implicit_als(weights)
+
+    return ALSModel(
+        list(state.users[:weights.shape[0]]),
+        list(state.cars[:weights.shape[1]]),
+        weights.indptr,
+        weights.indices,
+        user_factors,
+        item_factors
+    )
+
+
+class ALSStore:
+
+    # The web-side half: serves the last published factors, memory-mapped
+    # so every worker shares one copy, and swaps in a newer build with a
+    # single attribute assignment. Nothing here trains.
+    def __init__(self, path=ALS_DIR, reload_interval=ALS_RELOAD_INTERVAL):
+
+        self.path = path
+        self.reload_interval = reload_interval
+
+        self.current = None
+        self.stamp = None
+        self.last_check = None
+
+        self.lock = threading.Lock()
+
+    def published(self):
+
+        try:
+            stat = os.stat(os.path.join(self.path, "model.json"))
+        except OSError:
+            return None
+
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload(self):
+
+        now = time.monotonic()
+
+        if self.last_check is not None and now - self.last_check < self.reload_interval:
+            return
+
+        # Whoever gets here first checks; everyone else keeps serving.
+        if not self.lock.acquire(blocking=False):
+            return
+
+        try:
+
+            self.last_check = now
+
+            stamp = self.published()
+
+            if stamp is None or stamp == self.stamp:
+                return
+
+            model = load_model(self.path)
+
+            if model is not None:
+                self.current = model
+                self.stamp = stamp
+
+        finally:
+            self.lock.release()
+
+    def recommend(self, user_id, top_n=3):
+
+        self.reload()
+
+        model = self.current
+
+        if model is None:
+            return None
+
+        return model.recommend(user_id, top_n)
+
+
+def build(path=ALS_DIR):
+
+    from db import interactions_col
+    from cf_recommender import CFModel
+
+    model = train(CFModel(interactions_col))
+
+    if model is None:
+        return 0
+
+    save_model(model, path)
+
+    return len(model.users)
+
+
+def retrain(path=ALS_DIR, interval=ALS_RETRAIN_INTERVAL, stopping=None):
+
+    # Every build goes through the same publish step, so workers switch
+    # over on their next reload check. A failed run keeps the last
+    # published factors and is retried on the next tick.
+    stopping = stopping or threading.Event()
+
+    while True:
+
+        try:
+            count = build(path)
+            logger.info("ALS factors trained for %d users", count)
+        except Exception:
+            logger.exception("ALS training failed")
+
+        if stopping.wait(interval):
+            return
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Train the implicit ALS model and publish its factors")
+    parser.add_argument("--path", default=ALS_DIR)
+    parser.add_argument(
+        "--every",
+        type=float,
+        default=ALS_RETRAIN_INTERVAL,
+        help="Keep running and retrain every this many seconds"
+    )
+
+    args = parser.parse_args()
+
+    if args.every > 0:
+
+        logging.basicConfig(level=logging.INFO)
+        retrain(args.path, args.every)
+
+    else:
+
+        count = build(args.path)
+
+        print(f"ALS factors trained for {count} users")
+
+    sys.exit(0)
@@ -1,16 +1,16 @@
 import os
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from bson import ObjectId
-from datetime import datetime
 
-from auth import login_user, register_user
-from cars import get_all_cars
-from interactions import log_booking_interaction, log_interaction
-from recommender import recommend_cbf
-from cf_recommender import recommend_cf
-from db import interactions_col, cars_col
+import services
+from rate_limit import client_address
+from tokens import bearer_token
+from catalog_cache import catalog
+from export import export_allowed, export_stream
+from interaction_queue import interaction_queue
+from recommender import cbf_cache
+from cf_recommender import cf_cache, model as cf_model
 
 app = Flask(__name__)
 CORS(app)
@@ -19,16 +19,6 @@ logging.basicConfig(level=logging.DEBUG)
 
 
 
-def is_existing_user(user_id):
-
-    count = interactions_col.count_documents({
-        "user_id": ObjectId(user_id)
-    })
-
-    return count >= 3
-
-
-
 def calculate_price(cc, days):
 
     base_price = 800
@@ -42,162 +32,161 @@ def calculate_price(cc, days):
 
 
 
-@app.route("/api/login", methods=["POST"])
-def api_login():
+def request_ip():
 
-    data = request.get_json()
+    return client_address(
+        request.remote_addr,
+        request.headers.get("X-Forwarded-For")
+    )
 
-    user = login_user(data.get("email"), data.get("password"))
 
-    if not user:
-        return jsonify({"error": "Invalid credentials"}), 401
 
-    user["_id"] = str(user["_id"])
-    user.pop("password", None)
+def request_token():
 
-    return jsonify({"user": user})
+    return bearer_token(request.headers.get("Authorization"))
 
 
 
-@app.route("/api/signup", methods=["POST"])
-def api_signup():
+def respond(result):
 
-    data = request.get_json()
+    body, status = result
+
+    return jsonify(body), status
 
-    ok = register_user(
-        data.get("name"),
-        data.get("email"),
-        data.get("phone"),
-        data.get("password")
-    )
 
-    return jsonify({"success": ok})
+
+@app.route("/api/login", methods=["POST"])
+def api_login():
+
+    return respond(services.login(request.get_json(), request_ip()))
+
+
+
+@app.route("/api/signup", methods=["POST"])
+def api_signup():
+
+    return respond(services.signup(request.get_json(), request_ip()))
 
 
 @app.route("/api/cars", methods=["GET"])
 def api_cars():
 
-    cars = get_all_cars()
+    if request.args:
+        return api_cars_page()
 
-    for car in cars:
-        car["_id"] = str(car["_id"])
+    snapshot = catalog.get()
 
-    return jsonify(cars)
+    response = Response(snapshot.body, mimetype="application/json")
+    response.set_etag(snapshot.etag)
 
+    return response.make_conditional(request)
 
 
-@app.route("/api/recommend", methods=["POST"])
-def api_recommend():
 
-    data = request.get_json()
+def api_cars_page():
 
-    user_id = data.get("user_id")
-    prefs = data.get("preferences")
+    snapshot, etag = services.cars_page_etag(request.args)
 
-    cbf_cars = recommend_cbf(prefs, top_n=3)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
 
-    cf_cars = []
+    body, status = services.cars_page(snapshot, request.args, etag)
 
-    if user_id and is_existing_user(user_id):
+    if status != 200:
+        return jsonify(body), status
 
-        cf_cars = recommend_cf(ObjectId(user_id), top_n=2)
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
 
-    return jsonify({
-        "cbf": cbf_cars,
-        "cf": cf_cars
-    })
+    return response
 
 
 
-@app.route("/api/user-bookings/<user_id>", methods=["GET"])
-def user_bookings(user_id):
+@app.route("/api/cars/<car_id>/similar", methods=["GET"])
+def api_similar_cars(car_id):
 
-    pipeline = [
-        {
-            "$match": {
-                "user_id": ObjectId(user_id),
-                "action": "book"
-            }
-        },
-        {
-            "$group": {
-                "_id": "$car_id",
-                "count": {"$sum": 1}
-            }
-        }
-    ]
+    return respond(services.similar(car_id, request.args.get("limit", 5)))
 
-    results = list(interactions_col.aggregate(pipeline))
 
-    output = []
 
-    for r in results:
+@app.route("/api/recommend", methods=["POST"])
+def api_recommend():
 
-        car = cars_col.find_one({"_id": r["_id"]})
+    return respond(services.recommend(request.get_json(), request_token()))
 
-        if car:
 
-            output.append({
-                "car": f"{car['Brand']} {car['Model']}",
-                "count": r["count"]
-            })
 
-    return jsonify(output)
+@app.route("/api/recommend/batch", methods=["POST"])
+def api_recommend_batch():
 
+    return respond(services.recommend_batch(request.get_json(), request_token()))
 
 
-@app.route("/api/interact", methods=["POST"])
-def api_interact():
 
-    data = request.get_json()
+@app.route("/api/recommend/hybrid", methods=["POST"])
+def api_recommend_hybrid():
 
-    action = data.get("action")
-    user_id = data.get("user_id")
-    car_id = data.get("car_id")
+    return respond(services.recommend_blended(request.get_json(), request_token()))
 
-    doc = {
-        "user_id": ObjectId(user_id),
-        "action": action,
-        "timestamp": datetime.utcnow()
-    }
 
-    
-    if car_id:
-        try:
-            doc["car_id"] = ObjectId(car_id)
-        except:
-            pass
 
-    interactions_col.insert_one(doc)
+@app.route("/api/user-bookings/<user_id>", methods=["GET"])
+def user_bookings(user_id):
+
+    return respond(services.user_bookings(user_id, request_token()))
 
-    return jsonify({"success": True})
+
+
+@app.route("/api/interact", methods=["POST"])
+def api_interact():
+
+    return respond(services.interact(request.get_json(), request_token()))
 
 
 
 @app.route("/api/book", methods=["POST"])
 def api_book():
 
+    return respond(services.book(request.get_json(silent=True) or {}, request_token()))
+
+
+
+@app.route("/api/interactions/export", methods=["GET"])
+def api_export_interactions():
+
+    if not export_allowed(request.headers.get("X-API-Key")):
+        return jsonify({"error": "Forbidden"}), 403
+
     try:
+        chunks, mimetype = export_stream(
+            request.args.get("format", "ndjson"),
+            since=request.args.get("since"),
+            after=request.args.get("after")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Pages are fetched as the client reads, so memory stays flat.
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
 
-        data = request.get_json()
 
-        user_id = data.get("user_id")
-        car_id = data.get("car_id")
+@app.route("/api/metrics/interactions", methods=["GET"])
+def interaction_metrics():
 
-        interactions_col.insert_one({
-            "user_id": ObjectId(user_id),
-            "car_id": ObjectId(car_id),
-            "action": "book",
-            "timestamp": datetime.utcnow()
-        })
+    return jsonify(interaction_queue.stats())
 
-        return jsonify({"success": True})
 
-    except Exception as e:
 
-        print("BOOK ERROR:", e)
+@app.route("/api/metrics/cache", methods=["GET"])
+def cache_metrics():
 
-        return jsonify({"success": False})
+    return jsonify({
+        "cbf": cbf_cache.stats(),
+        "cf": cf_cache.stats()
+    })
 
 
 
@@ -211,4 +200,7 @@ if __name__ == "__main__":
 
     port = int(os.environ.get("PORT", 5000))
 
+    # Under a WSGI server the first CF request starts it instead.
+    cf_model.start()
+
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,263 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+import services
+from rate_limit import client_address
+from tokens import InvalidSession, bearer_token
+from catalog_cache import catalog
+from export import export_allowed, export_stream
+from interaction_queue import interaction_queue
+from password_pool import password_pool
+from recommender import cbf_cache
+from cf_recommender import cf_cache, model as cf_model
+
+
+# PyMongo, bcrypt and the recommenders all block, so handlers hand them to
+# this pool and stay free to serve other requests while they wait.
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", 32))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi")
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run(fn, *args):
+
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+def json_response(body, status=200, request=None):
+
+    payload = json.dumps(body, separators=(",", ":"), default=str).encode("utf-8")
+
+    if request is None:
+        return Response(payload, status, media_type="application/json")
+
+    return conditional_response(
+        request,
+        payload,
+        hashlib.sha1(payload).hexdigest()
+    )
+
+
+def not_modified(request, etag):
+
+    return f'"{etag}"' in request.headers.get("if-none-match", "")
+
+
+def conditional_response(request, payload, etag):
+
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": f'"{etag}"'})
+
+    return Response(
+        payload,
+        media_type="application/json",
+        headers={"ETag": f'"{etag}"'}
+    )
+
+
+async def read_json(request):
+
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+def request_ip(request):
+
+    return client_address(
+        request.client.host if request.client else None,
+        request.headers.get("x-forwarded-for")
+    )
+
+
+def request_token(request):
+
+    return bearer_token(request.headers.get("authorization"))
+
+
+def service_route(fn, with_ip=False, with_token=False):
+
+    # POST routes whose body is a single blocking service call.
+    async def handler(request):
+
+        args = [await read_json(request)]
+
+        if with_ip:
+            args.append(request_ip(request))
+
+        if with_token:
+            args.append(request_token(request))
+
+        body, status = await run(fn, *args)
+
+        return json_response(body, status)
+
+    return handler
+
+
+async def api_cars(request):
+
+    if request.query_params:
+
+        params = request.query_params
+
+        snapshot, etag = await run(services.cars_page_etag, params)
+
+        if not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": f'"{etag}"'})
+
+        body, status = await run(services.cars_page, snapshot, params, etag)
+
+        if status != 200:
+            return json_response(body, status)
+
+        return conditional_response(request, body, etag)
+
+    snapshot = await run(catalog.get)
+
+    return conditional_response(request, snapshot.body, snapshot.etag)
+
+
+async def api_similar_cars(request):
+
+    body, status = await run(
+        services.similar,
+        request.path_params["car_id"],
+        request.query_params.get("limit", 5)
+    )
+
+    return json_response(body, status)
+
+
+async def api_recommend(request):
+
+    data = await read_json(request)
+
+    try:
+        user_id, claims = services.session_user(data, request_token(request))
+    except InvalidSession:
+        return json_response(*services.unauthorized())
+
+    # CBF scoring does not depend on the CF gate (a user_stats read, or
+    # nothing with a token that caches it), so run both at once; CF only
+    # starts once the gate has passed.
+    cbf_cars, (cf_cars, token) = await asyncio.gather(
+        run(services.content_recommendations, data.get("preferences")),
+        run(services.collaborative_recommendations, user_id, claims)
+    )
+
+    return json_response(*services.recommend_response(cbf_cars, cf_cars, token))
+
+
+async def user_bookings(request):
+
+    body, status = await run(
+        services.user_bookings,
+        request.path_params["user_id"],
+        request_token(request)
+    )
+
+    return json_response(body, status)
+
+
+async def export_interactions(request):
+
+    if not export_allowed(request.headers.get("x-api-key")):
+        return json_response({"error": "Forbidden"}, 403)
+
+    params = request.query_params
+
+    try:
+        chunks, mimetype = export_stream(
+            params.get("format", "ndjson"),
+            since=params.get("since"),
+            after=params.get("after")
+        )
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    # A plain generator: Starlette pulls it on a worker thread, one page of
+    # Mongo results at a time.
+    return StreamingResponse(chunks, media_type=mimetype)
+
+
+async def interaction_metrics(request):
+
+    return json_response(interaction_queue.stats())
+
+
+async def cache_metrics(request):
+
+    return json_response({
+        "cbf": cbf_cache.stats(),
+        "cf": cf_cache.stats()
+    })
+
+
+async def home(request):
+
+    return json_response({"status": "ASGI backend running"})
+
+
+@asynccontextmanager
+async def lifespan(app):
+
+    # Start the first CF load now rather than on the first request.
+    cf_model.start()
+
+    yield
+
+    cf_model.stop()
+
+    await run(interaction_queue.flush)
+
+    password_pool.shutdown()
+
+
+routes = [
+    Route("/api/login", service_route(services.login, with_ip=True), methods=["POST"]),
+    Route("/api/signup", service_route(services.signup, with_ip=True), methods=["POST"]),
+    Route("/api/cars", api_cars, methods=["GET"]),
+    Route("/api/cars/{car_id}/similar", api_similar_cars, methods=["GET"]),
+    Route("/api/recommend", api_recommend, methods=["POST"]),
+    Route("/api/recommend/batch", service_route(services.recommend_batch, with_token=True), methods=["POST"]),
+    Route("/api/recommend/hybrid", service_route(services.recommend_blended, with_token=True), methods=["POST"]),
+    Route("/api/user-bookings/{user_id}", user_bookings, methods=["GET"]),
+    Route("/api/interact", service_route(services.interact, with_token=True), methods=["POST"]),
+    Route("/api/book", service_route(services.book, with_token=True), methods=["POST"]),
+    Route("/api/interactions/export", export_interactions, methods=["GET"]),
+    Route("/api/metrics/interactions", interaction_metrics, methods=["GET"]),
+    Route("/api/metrics/cache", cache_metrics, methods=["GET"]),
+    Route("/", home),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan
+)
+
+
+if __name__ == "__main__":
+
+    import uvicorn
+
+    port = int(os.environ.get("PORT", 5000))
+
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -1,5 +1,6 @@
 from db import users_col
-import bcrypt
+from pymongo.errors import DuplicateKeyError
+from password_pool import password_pool
 
 
 def register_user(name, email, phone, password):
@@ -7,14 +8,19 @@ def register_user(name, email, phone, password):
     if existing_user:
         return False
 
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-
-    users_col.insert_one({
-        "name": name,
-        "email": email,
-        "phone": phone,
-        "password": hashed_password
-    })
+    # Both bcrypt calls run in the password pool and raise PasswordPoolBusy
+    # when it is saturated.
+    hashed_password = password_pool.hash(password)
+
+    try:
+        users_col.insert_one({
+            "name": name,
+            "email": email,
+            "phone": phone,
+            "password": hashed_password
+        })
+    except DuplicateKeyError:
+        return False
 
     return True
 
@@ -27,7 +33,7 @@ def login_user(email, password):
 
     stored_password = user["password"]
 
-    if bcrypt.checkpw(password.encode("utf-8"), stored_password):
+    if password_pool.check(password, stored_password):
         return user
 
     return None
\ No newline at end of file
@@ -0,0 +1,111 @@
+import argparse
+import multiprocessing as mp
+
+
+def memory_kb():
+
+    usage = {}
+
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                usage[parts[0][:-1]] = int(parts[1])
+
+    return usage
+
+
+def private_copy(engine):
+
+    # What every worker held before: its own in-memory arrays.
+    engine.matrix_t = engine.matrix_t.copy()
+    engine.numeric_score = engine.numeric_score.copy()
+    engine.brand_codes = engine.brand_codes.copy()
+    engine.model_codes = engine.model_codes.copy()
+    engine.catalog.codes = {col: v.copy() for col, v in engine.catalog.codes.items()}
+    engine.catalog.numerics = {col: v.copy() for col, v in engine.catalog.numerics.items()}
+
+
+def fit_in_process():
+
+    # The pre-artifact startup path: pandas catalog plus a TF-IDF fit.
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from model_artifacts import CBF_CSV_PATH
+
+    df = pd.read_csv(CBF_CSV_PATH)
+    text = df["Brand"] + " " + df["Fuel_Type"] + " " + df["Body_Type"]
+
+    return df, TfidfVectorizer(stop_words="english").fit_transform(text)
+
+
+def worker(mode, barrier, results):
+
+    from recommender import get_engine
+    from precompute import preference_grid
+
+    before = memory_kb()
+
+    engine = get_engine()
+
+    # "fit" keeps the pandas frame and TF-IDF matrix alive until the
+    # measurement, as the old startup path held them for the process life.
+    fitted = fit_in_process() if mode == "fit" else None
+
+    if mode in ("fit", "private"):
+        private_copy(engine)
+
+    # Touch every page the request path reads.
+    engine.recommend_batch(list(preference_grid()), 10)
+
+    # Measure while all workers are alive so PSS splits shared pages.
+    barrier.wait()
+
+    after = memory_kb()
+
+    results.put({k: after[k] - before[k] for k in after})
+
+    barrier.wait()
+
+    del fitted
+
+
+def run(mode, workers):
+
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+
+    procs = [
+        ctx.Process(target=worker, args=(mode, barrier, results))
+        for _ in range(workers)
+    ]
+
+    for p in procs:
+        p.start()
+
+    deltas = [results.get() for _ in procs]
+
+    for p in procs:
+        p.join()
+
+    return {
+        k: sum(d[k] for d in deltas) / len(deltas) for k in deltas[0]
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Per-worker memory of the CBF engine")
+    parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+
+    from model_artifacts import ensure_artifacts
+    ensure_artifacts()
+
+    print(f"{'mode':<10}{'RSS kB':>12}{'PSS kB':>12}   (growth per worker, {args.workers} workers)")
+
+    for mode in ("fit", "private", "shared"):
+        usage = run(mode, args.workers)
+        print(f"{mode:<10}{usage['Rss']:>12.0f}{usage['Pss']:>12.0f}")
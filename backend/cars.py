@@ -1,7 +1,158 @@
+import os
+import json
+import bisect
+import hashlib
+import operator
+import itertools
 from db import cars_col
+from catalog_cache import catalog
+from rec_cache import LRUCache
+from bson import ObjectId
+from bson.errors import InvalidId
 
 def get_all_cars():
-    cars = list(cars_col.find())
-    for c in cars:
-        c["_id"] = str(c["_id"])
-    return cars
+    return [dict(c) for c in catalog.get().cars]
+
+
+def to_object_id(value):
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def get_cars_by_ids(car_ids):
+    # One $in query for the whole list; the result lines up with car_ids,
+    # with None where an id is invalid or no longer in the catalog.
+    ids = [to_object_id(c) for c in car_ids]
+
+    wanted = list({i for i in ids if i is not None})
+
+    found = {}
+    if wanted:
+        for c in cars_col.find({"_id": {"$in": wanted}}):
+            c["_id"] = str(c["_id"])
+            found[c["_id"]] = c
+
+    return [
+        dict(found[str(i)]) if i is not None and str(i) in found else None
+        for i in ids
+    ]
+
+
+CATEGORY_FILTERS = ["Brand", "Fuel_Type", "Body_Type", "Transmission"]
+
+RANGE_FILTERS = {
+    "min_mileage": ("Mileage", operator.ge),
+    "max_mileage": ("Mileage", operator.le),
+    "min_cc": ("Engine_CC", operator.ge),
+    "max_cc": ("Engine_CC", operator.le),
+}
+
+PAGE_PARAMS = CATEGORY_FILTERS + list(RANGE_FILTERS) + ["fields", "limit", "after"]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Rendered pages by ETag; an ETag names one snapshot and one query, so
+# entries never go stale, they just stop being asked for.
+page_cache = LRUCache(int(os.getenv("CARS_PAGE_CACHE_SIZE", 256)))
+
+
+def car_filter(filters):
+    # The filters /api/cars takes, as a predicate over snapshot rows. Same
+    # matching as the Mongo query it replaces: exact category values,
+    # numeric bounds only on numeric fields.
+    wanted = {}
+
+    for field in CATEGORY_FILTERS:
+        value = filters.get(field)
+        if value:
+            wanted[field] = set(value.split(","))
+
+    bounds = []
+
+    for param, (field, compare) in RANGE_FILTERS.items():
+        value = filters.get(param)
+        if value not in (None, ""):
+            bounds.append((field, compare, float(value)))
+
+    def keep(car):
+        for field, values in wanted.items():
+            if car.get(field) not in values:
+                return False
+        for field, compare, bound in bounds:
+            value = car.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return False
+            if not compare(value, bound):
+                return False
+        return True
+
+    return keep
+
+
+def find_cars(snapshot, filters, fields=None, limit=DEFAULT_PAGE_SIZE, after=None):
+    # Keyset paging over the snapshot, which is sorted by _id.
+    keep = car_filter(filters)
+
+    start = 0
+    if after:
+        after_id = to_object_id(after)
+        if after_id is None:
+            raise ValueError(f"Invalid cursor: {after}")
+        start = bisect.bisect_right(snapshot.ids, str(after_id))
+
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    cars = []
+    next_cursor = None
+
+    for car in itertools.islice(snapshot.cars, start, None):
+        if not keep(car):
+            continue
+        if len(cars) == limit:
+            next_cursor = cars[-1]["_id"]
+            break
+        if fields:
+            car = {f: car[f] for f in ["_id"] + fields if f in car}
+        cars.append(dict(car))
+
+    return cars, next_cursor
+
+
+def page_etag(snapshot, args):
+    # Known before any filtering: the snapshot's ETag plus the query.
+    query = {p: args.get(p) for p in PAGE_PARAMS if args.get(p) not in (None, "")}
+
+    key = snapshot.etag + json.dumps(query, sort_keys=True)
+
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def render_page(snapshot, args, etag):
+    found, payload = page_cache.get(etag)
+    if found:
+        return payload
+
+    fields = [f for f in args.get("fields", "").split(",") if f]
+
+    cars, next_cursor = find_cars(
+        snapshot,
+        args,
+        fields=fields,
+        limit=args.get("limit", DEFAULT_PAGE_SIZE),
+        after=args.get("after")
+    )
+
+    payload = json.dumps(
+        {"cars": cars, "next": next_cursor},
+        separators=(",", ":"),
+        default=str
+    ).encode("utf-8")
+
+    page_cache.put(etag, payload)
+
+    return payload
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from db import cars_col, meta_col
+
+
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", 300))
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", 5))
+
+CATALOG_VERSION_ID = "catalog_version"
+
+
+class CatalogSnapshot:
+
+    __slots__ = ("cars", "ids", "version", "body", "etag", "loaded_at")
+
+    def __init__(self, cars, version):
+
+        # Sorted by _id (see CatalogCache.load), so ids can be bisected
+        # for keyset paging.
+        self.cars = tuple(cars)
+        self.ids = tuple(c["_id"] for c in self.cars)
+        self.version = version
+
+        self.body = json.dumps(
+            self.cars,
+            separators=(",", ":"),
+            sort_keys=True,
+            default=str
+        ).encode("utf-8")
+
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.loaded_at = time.monotonic()
+
+    def __setattr__(self, name, value):
+
+        if hasattr(self, name):
+            raise AttributeError("CatalogSnapshot is immutable")
+
+        object.__setattr__(self, name, value)
+
+
+class CatalogCache:
+
+    def __init__(
+        self,
+        cars_collection,
+        meta_collection=None,
+        ttl=CATALOG_TTL,
+        poll_interval=CATALOG_POLL_INTERVAL
+    ):
+
+        self.cars_collection = cars_collection
+        self.meta_collection = meta_collection
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.last_poll = None
+
+    def current_version(self):
+
+        if self.meta_collection is None:
+            return None
+
+        doc = self.meta_collection.find_one({"_id": CATALOG_VERSION_ID})
+
+        return doc.get("version") if doc else 0
+
+    def is_stale(self, snapshot):
+
+        now = time.monotonic()
+
+        if self.ttl and now - snapshot.loaded_at >= self.ttl:
+            return True
+
+        if self.meta_collection is None:
+            return False
+
+        if self.last_poll is not None and now - self.last_poll < self.poll_interval:
+            return False
+
+        self.last_poll = now
+
+        return self.current_version() != snapshot.version
+
+    def load(self):
+
+        version = self.current_version()
+
+        cars = list(self.cars_collection.find().sort("_id", 1))
+
+        for c in cars:
+            c["_id"] = str(c["_id"])
+
+        self.last_poll = time.monotonic()
+
+        return CatalogSnapshot(cars, version)
+
+    def get(self):
+
+        snapshot = self.snapshot
+
+        if snapshot is not None and not self.is_stale(snapshot):
+            return snapshot
+
+        with self.lock:
+
+            # Another thread may have reloaded while we waited.
+            if self.snapshot is not snapshot:
+                return self.snapshot
+
+            self.snapshot = self.load()
+
+            return self.snapshot
+
+    def invalidate(self):
+
+        self.snapshot = None
+
+
+def bump_catalog_version(meta_collection=meta_col):
+
+    meta_collection.update_one(
+        {"_id": CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True
+    )
+
+
+catalog = CatalogCache(cars_col, meta_col)
@@ -0,0 +1,195 @@
+import os
+import json
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+HAS_ARROW = pa is not None
+
+
+# Where cleaning.py writes the columnar catalog of the CBF dataset.
+CATALOG_DIR = os.getenv(
+    "CLEAN_COLUMNAR_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "catalog")
+)
+
+
+CATEGORICAL_COLUMNS = ["Brand", "Model", "Fuel_Type", "Transmission", "Body_Type"]
+NUMERIC_COLUMNS = ["Car_ID", "Year", "Mileage", "Engine_CC"]
+
+# Upper bounds of every preference band but the last, in the order the
+# frontend lists them (Low, Medium, High).
+MILEAGE_EDGES = [15, 22]
+CC_EDGES = [1200, 2000]
+
+INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def int_type(low, high):
+
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+
+    return np.int64
+
+
+def narrow_int(values):
+
+    values = np.asarray(values)
+
+    low = values.min() if len(values) else 0
+    high = values.max() if len(values) else 0
+
+    return values.astype(int_type(low, high))
+
+
+def numeric_array(values):
+
+    values = np.asarray(values, dtype=np.float64)
+
+    # Whole numbers keep their int type (and their JSON form); anything
+    # fractional is stored as float32.
+    if np.array_equal(values, np.floor(values)):
+        return narrow_int(values.astype(np.int64))
+
+    return values.astype(np.float32)
+
+
+def band_codes(values, edges):
+
+    return np.searchsorted(edges, values, side="right").astype(np.int8)
+
+
+def column_path(path, col, prefix="col_"):
+
+    return os.path.join(path, prefix + col + ".npy")
+
+
+def write_dictionaries(path, dictionaries, numeric, prefix="col_"):
+
+    # Written last by both writers; ColumnarCatalog.load reads the column
+    # list from it.
+    with open(os.path.join(path, prefix + "dictionaries.json"), "w") as f:
+        json.dump({
+            "categorical": list(dictionaries),
+            "numeric": list(numeric),
+            "dictionaries": dictionaries
+        }, f)
+
+
+class ColumnarCatalog:
+
+    # Categoricals are held as small-int codes plus a dictionary of their
+    # distinct values; numerics as the narrowest type that fits.
+    def __init__(self, codes, dictionaries, numerics):
+
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.numerics = numerics
+
+        self.lookups = {
+            col: {value: i for i, value in enumerate(values)}
+            for col, values in dictionaries.items()
+        }
+
+    def __len__(self):
+
+        for values in list(self.codes.values()) + list(self.numerics.values()):
+            return len(values)
+
+        return 0
+
+    @property
+    def columns(self):
+
+        return list(self.codes) + list(self.numerics)
+
+    def code(self, col, value):
+
+        return self.lookups[col].get(value, -1)
+
+    def values(self, col, rows):
+
+        if col in self.codes:
+            dictionary = self.dictionaries[col]
+            return [dictionary[c] for c in self.codes[col][rows].tolist()]
+
+        return self.numerics[col][rows].tolist()
+
+    @classmethod
+    def from_frame(cls, df, categorical=CATEGORICAL_COLUMNS, numeric=NUMERIC_COLUMNS):
+
+        import pandas as pd
+
+        codes = {}
+        dictionaries = {}
+        numerics = {}
+
+        for col in categorical:
+            if col in df:
+                values, uniques = pd.factorize(df[col].astype(str))
+                codes[col] = narrow_int(values)
+                dictionaries[col] = [str(v) for v in uniques]
+
+        for col in numeric:
+            if col in df:
+                values = pd.to_numeric(df[col], errors="coerce").fillna(0)
+                numerics[col] = numeric_array(values.to_numpy())
+
+        return cls(codes, dictionaries, numerics)
+
+    def save(self, path, prefix="col_"):
+
+        os.makedirs(path, exist_ok=True)
+
+        for col, values in list(self.codes.items()) + list(self.numerics.items()):
+            np.save(column_path(path, col, prefix), values)
+
+        write_dictionaries(path, self.dictionaries, list(self.numerics), prefix)
+
+    @classmethod
+    def load(cls, path, prefix="col_", mmap_mode="r"):
+
+        with open(os.path.join(path, prefix + "dictionaries.json")) as f:
+            meta = json.load(f)
+
+        def array(col):
+            return np.load(column_path(path, col, prefix), mmap_mode=mmap_mode)
+
+        return cls(
+            {col: array(col) for col in meta["categorical"]},
+            meta["dictionaries"],
+            {col: array(col) for col in meta["numeric"]}
+        )
+
+    def to_arrow(self):
+
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+
+        columns = {}
+
+        for col, values in self.codes.items():
+            columns[col] = pa.DictionaryArray.from_arrays(
+                np.asarray(values),
+                pa.array(self.dictionaries[col], type=pa.string())
+            )
+
+        for col, values in self.numerics.items():
+            columns[col] = pa.array(np.asarray(values))
+
+        return pa.table(columns)
+
+    def write_parquet(self, path):
+
+        if pq is None:
+            raise RuntimeError("pyarrow is not installed")
+
+        pq.write_table(self.to_arrow(), path)
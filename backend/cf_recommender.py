@@ -1,75 +1,671 @@
-import pandas as pd
-from db import interactions_col, cars_col
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+import numpy as np
+from scipy import sparse
 from bson import ObjectId
+from db import interactions_col
+from cars import get_cars_by_ids
+from rec_cache import LRUCache
+from diversity import POOL_GROWTH, capped_top
+from interactions import ACTION_WEIGHTS
+from als import ALSStore
+from item_neighbours import ItemNeighbours
+
+
+REFRESH_INTERVAL = float(os.getenv("CF_REFRESH_INTERVAL", 10))
+
+# Each refresh scans from the newest _id already counted, less this much,
+# and skips the ones it has seen. Workers stamp _ids when they flush, so an
+# insert that lands after a later worker's (clock skew, a slow insert) is
+# still picked up as long as it is late by less than this; anything later
+# waits for the next full load (a restart, or python als.py).
+SKEW_SECONDS = float(os.getenv("CF_SKEW_SECONDS", 5))
+
+NEIGHBOURS = 3
+
+# Cars per user whose neighbour lists feed the "items" ranking.
+RECENT_CARS = int(os.getenv("CF_RECENT_CARS", 10))
+
+# "items" merges the precomputed neighbour lists of the user's recent cars
+# (item_neighbours.py); "neighbours" ranks by co-occurrence with the most
+# similar users; "als" serves the implicit ALS factors trained offline by
+# python als.py.
+CF_MODEL = os.getenv("CF_MODEL", "items")
+
+# At most this many recommendations per brand; 0 keeps the plain ranking.
+CF_BRAND_LIMIT = int(os.getenv("CF_BRAND_LIMIT", 0))
+
+CF_CACHE_SIZE = int(os.getenv("CF_CACHE_SIZE", 10000))
+CF_CACHE_TTL = float(os.getenv("CF_CACHE_TTL", 30))
+
+logger = logging.getLogger(__name__)
+
+# "exact" is the reference mode; "lsh" trades recall for latency once the
+# user base is large. More tables raise recall, more bits shrink buckets.
+CF_INDEX = os.getenv("CF_INDEX", "exact")
+LSH_TABLES = int(os.getenv("CF_LSH_TABLES", 16))
+LSH_BITS = int(os.getenv("CF_LSH_BITS", 10))
+
+
+def rank_neighbours(candidates, scores, user_pos, k):
+
+    keep = (candidates != user_pos) & (scores > 0)
+    candidates = candidates[keep]
+    scores = scores[keep]
+
+    order = np.lexsort((candidates, -scores))[:k]
+
+    return candidates[order].tolist()
+
+
+class ExactIndex:
+
+    def __init__(self):
+
+        self.state = None
+
+    def rebuild(self, matrix):
+
+        self.state = (matrix, matrix.T.tocsr())
+
+    def insert(self, matrix, users):
+
+        self.rebuild(matrix)
+
+    def query(self, user_pos, k):
+
+        if self.state is None:
+            return []
+
+        matrix, matrix_t = self.state
+
+        if user_pos >= matrix.shape[0]:
+            return []
+
+        # Only users sharing a car with the target show up here, so the
+        # cost follows those cars' popularity, not the interaction count.
+        sims = (matrix[user_pos] @ matrix_t).tocsr()
+
+        return rank_neighbours(sims.indices, sims.data, user_pos, k)
+
+
+class LSHIndex:
+
+    def __init__(self, tables=LSH_TABLES, bits=LSH_BITS, seed=0):
+
+        self.tables = tables
+        self.bits = bits
+        self.rng = np.random.default_rng(seed)
+        self.weights = 1 << np.arange(bits, dtype=np.int64)
+
+        self.planes = np.empty((0, tables * bits), dtype=np.float32)
+        self.signatures = np.empty((0, tables), dtype=np.int64)
+        self.buckets = [{} for _ in range(tables)]
+        self.matrix = None
+
+    def grow_planes(self, n_cars):
+
+        extra = n_cars - self.planes.shape[0]
+
+        if extra > 0:
+            self.planes = np.vstack([
+                self.planes,
+                self.rng.standard_normal(
+                    (extra, self.tables * self.bits)
+                ).astype(np.float32)
+            ])
+
+    def signature(self, matrix, users):
+
+        # Random-hyperplane hashing: users pointing the same way in car
+        # space tend to land in the same bucket of each table.
+        projected = np.asarray(matrix[users] @ self.planes)
+        bits = (projected > 0).reshape(len(users), self.tables, self.bits)
+
+        return bits @ self.weights
+
+    def rebuild(self, matrix):
+
+        self.planes = np.empty((0, self.tables * self.bits), dtype=np.float32)
+        self.signatures = np.empty((0, self.tables), dtype=np.int64)
+        self.buckets = [{} for _ in range(self.tables)]
+
+        self.insert(matrix, np.arange(matrix.shape[0]))
+
+    def insert(self, matrix, users):
+
+        users = np.asarray(users, dtype=np.int64)
+
+        self.grow_planes(matrix.shape[1])
+
+        signatures = self.signature(matrix, users)
+
+        known = self.signatures.shape[0]
+
+        if matrix.shape[0] > known:
+            self.signatures = np.vstack([
+                self.signatures,
+                np.full((matrix.shape[0] - known, self.tables), -1)
+            ])
+
+        for user, new in zip(users.tolist(), signatures.tolist()):
+
+            old = self.signatures[user].tolist()
+
+            for table, (before, after) in enumerate(zip(old, new)):
+
+                if before == after:
+                    continue
+
+                buckets = self.buckets[table]
+
+                if before >= 0:
+                    buckets[before].remove(user)
+
+                buckets.setdefault(after, []).append(user)
+
+            self.signatures[user] = new
+
+        self.matrix = matrix
+
+    def query(self, user_pos, k):
+
+        matrix = self.matrix
+
+        if matrix is None or user_pos >= self.signatures.shape[0]:
+            return []
+
+        candidates = set()
+
+        for table, key in enumerate(self.signatures[user_pos].tolist()):
+            candidates.update(self.buckets[table].get(key, ()))
+
+        candidates.discard(user_pos)
+
+        if not candidates:
+            return []
+
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        candidates = candidates[candidates < matrix.shape[0]]
+
+        # Exact re-rank of the (small) candidate set.
+        scores = (matrix[candidates] @ matrix[user_pos].T).toarray().ravel()
+
+        return rank_neighbours(candidates, scores, user_pos, k)
+
+
+def make_index(kind=CF_INDEX):
+
+    if kind == "lsh":
+        return LSHIndex()
+
+    if kind == "exact":
+        return ExactIndex()
+
+    raise ValueError(f"Unknown CF index: {kind}")
+
+
+def skew_floor(last_id):
+
+    return ObjectId.from_datetime(
+        last_id.generation_time - timedelta(seconds=SKEW_SECONDS)
+    )
+
+
+class CFState:
+
+    # What one refresh publishes. It is never changed afterwards, so a
+    # reader that takes model.state once gets a matrix, weights and recent
+    # lists that agree with each other. The id lists and their lookups are
+    # append-only and shared by every state: any position below this
+    # state's matrix shape means the same user or car in all later ones.
+    __slots__ = (
+        "users", "user_index", "cars", "car_index",
+        "matrix", "weighted", "popularity", "recent"
+    )
+
+    def __init__(self, users, user_index, cars, car_index, matrix, weighted, popularity, recent):
+
+        object.__setattr__(self, "users", users)
+        object.__setattr__(self, "user_index", user_index)
+        object.__setattr__(self, "cars", cars)
+        object.__setattr__(self, "car_index", car_index)
+
+        object.__setattr__(self, "matrix", matrix)
+
+        # Same cells as matrix, summed with ACTION_WEIGHTS instead of 1.
+        object.__setattr__(self, "weighted", weighted)
+        object.__setattr__(self, "popularity", popularity)
+
+        # Car positions each user touched last, oldest first.
+        object.__setattr__(self, "recent", recent)
+
+    def __setattr__(self, name, value):
+
+        raise AttributeError("CFState is immutable")
+
+
+def empty_state():
+
+    return CFState(
+        [], {}, [], {},
+        sparse.csr_matrix((0, 0), dtype=np.int64),
+        sparse.csr_matrix((0, 0), dtype=np.float64),
+        np.zeros(0, dtype=np.int64),
+        {}
+    )
+
+
+class CFModel:
+
+    def __init__(self, collection, index=None):
+
+        self.collection = collection
+        self.index = index if index is not None else make_index()
+        self.items = ItemNeighbours()
+        self.lock = threading.Lock()
+
+        self.state = empty_state()
+
+        self.last_id = None
+        self.seen = set()
+        self.last_refresh = None
+
+        # Separate from self.lock, which refresh() only ever tries once.
+        self.start_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+
+        # Refreshes run on their own thread, first the full load and then
+        # every REFRESH_INTERVAL, so no request ever waits on a scan.
+        # Until the first one lands, requests see an empty model.
+        if self.thread is not None:
+            return
+
+        with self.start_lock:
+
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name="cf-refresher",
+                    daemon=True
+                )
+                self.thread.start()
+
+    def run(self):
+
+        while not self.stopping.is_set():
+
+            try:
+                self.refresh(force=True)
+            except Exception:
+                logger.exception("CF refresh failed")
+
+            self.stopping.wait(REFRESH_INTERVAL)
+
+    def stop(self):
+
+        self.stopping.set()
+
+    def position(self, ids, index, key):
+
+        if key not in index:
+            index[key] = len(ids)
+            ids.append(key)
+
+        return index[key]
+
+    def refresh(self, force=False):
+
+        now = time.monotonic()
+
+        if (
+            not force and
+            self.last_refresh is not None and
+            now - self.last_refresh < REFRESH_INTERVAL
+        ):
+            return
+
+        # One refresher at a time. Callers that find a refresh already
+        # running carry on with the current state rather than queue behind
+        # the rebuild; readers never touch this lock at all.
+        if not self.lock.acquire(blocking=False):
+            return
+
+        try:
+
+            if (
+                not force and
+                self.last_refresh is not None and
+                now - self.last_refresh < REFRESH_INTERVAL
+            ):
+                return
+
+            self.update(now)
+
+        finally:
+            self.lock.release()
+
+    def update(self, now):
+
+        # Everything new is built on copies; the only write readers can
+        # observe is the final self.state assignment.
+        query = {"car_id": {"$exists": True, "$ne": None}}
+
+        if self.last_id is not None:
+            query["_id"] = {"$gt": skew_floor(self.last_id)}
+
+        cursor = self.collection.find(
+            query,
+            {"user_id": 1, "car_id": 1, "action": 1}
+        ).sort("_id", 1)
+
+        state = self.state
+
+        recent = dict(state.recent)
+
+        rows = []
+        cols = []
+        weights = []
+
+        counted = []
+        last_id = self.last_id
+
+        for doc in cursor:
+
+            if doc["_id"] in self.seen:
+                continue
+
+            counted.append(doc["_id"])
+
+            # A late insert can sort below the newest id already counted.
+            if last_id is None or doc["_id"] > last_id:
+                last_id = doc["_id"]
+
+            user = self.position(
+                state.users, state.user_index, str(doc["user_id"])
+            )
+            car = self.position(
+                state.cars, state.car_index, str(doc["car_id"])
+            )
+
+            rows.append(user)
+            cols.append(car)
+
+            touched = recent.get(user, ())
+            recent[user] = (
+                tuple(c for c in touched if c != car) + (car,)
+            )[-RECENT_CARS:]
+            weights.append(ACTION_WEIGHTS.get(doc.get("action"), 1.0))
+
+        if rows:
+
+            shape = (len(state.users), len(state.cars))
+
+            delta = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                shape=shape
+            )
+
+            matrix = state.matrix.copy()
+            matrix.resize(shape)
+            matrix = (matrix + delta).tocsr()
+
+            weighted = state.weighted.copy()
+            weighted.resize(shape)
+            weighted = (weighted + sparse.csr_matrix(
+                (np.asarray(weights, dtype=np.float64), (rows, cols)),
+                shape=shape
+            )).tocsr()
+
+            self.index.insert(matrix, np.unique(rows))
+            self.items.update(matrix, np.unique(cols))
+
+            # Readers never lock; they take self.state once and only
+            # ever index it with positions its own matrix covers.
+            self.state = CFState(
+                state.users,
+                state.user_index,
+                state.cars,
+                state.car_index,
+                matrix,
+                weighted,
+                np.asarray(matrix.sum(axis=0)).ravel(),
+                recent
+            )
+
+        # Only ids the next scan's skew margin can reach need remembering.
+        if last_id is not None:
+            floor = skew_floor(last_id)
+            self.seen = {oid for oid in self.seen if oid > floor}
+            self.seen.update(oid for oid in counted if oid > floor)
+
+        self.last_id = last_id
+        self.last_refresh = now
+
+    def rebuild_index(self):
+
+        # Rebuild both indexes from the published matrix, e.g. after the
+        # LSH settings change; refreshes only ever insert into them.
+        with self.lock:
+
+            matrix = self.state.matrix
+
+            self.index.rebuild(matrix)
+            self.items.rebuild(matrix)
+
+    def similar_users(self, user_pos, matrix, k):
+
+        # The index is shared by every state, so after a refresh it can
+        # return users newer than this (older) matrix; skip those.
+        neighbours = [
+            other for other in self.index.query(user_pos, k)
+            if other < matrix.shape[0]
+        ]
+
+        # Like the old crosstab ranking, fall back to users with no overlap
+        # when fewer than k users share a car with the target.
+        taken = set(neighbours)
+        taken.add(user_pos)
+
+        for other in range(matrix.shape[0]):
+
+            if len(neighbours) >= k:
+                break
+
+            if other not in taken:
+                neighbours.append(other)
+
+        return neighbours
+
+    def recommend(self, user_id, top_n=3):
+
+        state = self.state
+        matrix = state.matrix
+
+        user_pos = state.user_index.get(str(user_id))
+
+        if user_pos is None or user_pos >= matrix.shape[0]:
+            return []
+
+        neighbours = self.similar_users(user_pos, matrix, NEIGHBOURS)
+
+        if len(neighbours) == 0:
+            return []
+
+        target_cars = set(matrix[user_pos].indices.tolist())
+
+        recommended = {}
+
+        for sim_user in neighbours:
+
+            row = matrix[sim_user]
+
+            for car in row.indices[row.data > 0].tolist():
+
+                if car not in target_cars:
+
+                    if car not in recommended:
+                        recommended[car] = 0
+
+                    recommended[car] += 1
+
+        sorted_cars = sorted(
+            recommended.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )[:top_n]
+
+        return [(state.cars[car], count) for car, count in sorted_cars]
+
+
+    def recommend_items(self, user_id, top_n=3):
+
+        state = self.state
+        matrix = state.matrix
+
+        user_pos = state.user_index.get(str(user_id))
+
+        if user_pos is None or user_pos >= matrix.shape[0]:
+            return None
+
+        ranked = self.items.recommend(
+            state.recent.get(user_pos, ()),
+            matrix[user_pos].indices,
+            top_n
+        )
+
+        if not ranked:
+            return None
+
+        return [(state.cars[car], score) for car, score in ranked]
+
+    def similar_cars(self, car_id, top_n=5):
+
+        state = self.state
+
+        car_pos = state.car_index.get(str(car_id))
+
+        if car_pos is None:
+            return []
+
+        return [
+            (state.cars[car], score)
+            for car, score in self.items.similar(car_pos, top_n)
+        ]
+
+
+model = CFModel(interactions_col)
+
+als_model = ALSStore()
+
+cf_cache = LRUCache(CF_CACHE_SIZE, CF_CACHE_TTL)
 
 
 def recommend_cf(user_id, top_n=3):
 
-    interactions = list(interactions_col.find())
+    key = (str(user_id), top_n)
+
+    hit, results = cf_cache.get(key)
+
+    if not hit:
+        results = compute_cf(user_id, top_n)
+        cf_cache.put(key, results)
+
+    return [dict(r) for r in results]
 
-    if len(interactions) == 0:
-        return []
 
-    df = pd.DataFrame(interactions)
+def cap_brands(ranked, limit, top_n):
 
-    if "user_id" not in df or "car_id" not in df:
-        return []
+    _, groups = np.unique(
+        [str(car.get("Brand", "")).lower() for _, car in ranked],
+        return_inverse=True
+    )
 
-    df["user_id"] = df["user_id"].astype(str)
-    df["car_id"] = df["car_id"].astype(str)
+    scores = np.array([score for score, _ in ranked], dtype=np.float64)
 
-    matrix = pd.crosstab(df["user_id"], df["car_id"])
+    return [ranked[pos] for pos in capped_top(scores, groups, limit, top_n)]
 
-    if str(user_id) not in matrix.index:
-        return []
 
-    target_vector = matrix.loc[str(user_id)]
+def rank_cf(user_id, top_n=3):
 
-    similarities = matrix.dot(target_vector)
+    # (car_id, score) pairs from the configured CF_MODEL, best first, and
+    # the reason to show with them; None means "n users also liked".
+    model.start()
 
-    similarities = similarities.drop(str(user_id))
+    sorted_cars = None
+    reason = None
 
-    similar_users = similarities.sort_values(ascending=False).head(3)
+    if CF_MODEL == "als":
+        sorted_cars = als_model.recommend(user_id, top_n)
+        reason = "Popular with renters like you"
 
-    if len(similar_users) == 0:
-        return []
+    elif CF_MODEL == "items":
+        sorted_cars = model.recommend_items(user_id, top_n)
+        reason = "Similar to cars you viewed"
 
-    recommended = {}
+    # Until the first ALS factors are published, for users newer than
+    # them, or when the item lists have nothing new, fall back to the
+    # neighbour ranking.
+    if sorted_cars is None:
+        sorted_cars = model.recommend(user_id, top_n)
+        reason = None
 
-    for sim_user in similar_users.index:
+    return sorted_cars, reason
 
-        user_cars = matrix.loc[sim_user]
 
-        liked_cars = user_cars[user_cars > 0].index
+def compute_cf(user_id, top_n=3):
 
-        for car in liked_cars:
+    # With a brand cap, hydrate a few extra candidates to fill the slots
+    # the cap removes.
+    pool = top_n * POOL_GROWTH if CF_BRAND_LIMIT > 0 else top_n
 
-            if car not in target_vector[target_vector > 0].index:
+    sorted_cars, reason = rank_cf(user_id, pool)
 
-                if car not in recommended:
-                    recommended[car] = 0
+    cars = get_cars_by_ids([car_id for car_id, _ in sorted_cars])
 
-                recommended[car] += 1
+    ranked = [
+        (score, car)
+        for (_, score), car in zip(sorted_cars, cars)
+        if car
+    ]
 
-    sorted_cars = sorted(
-        recommended.items(),
-        key=lambda x: x[1],
-        reverse=True
-    )[:top_n]
+    if CF_BRAND_LIMIT > 0 and ranked:
+        ranked = cap_brands(ranked, CF_BRAND_LIMIT, top_n)
 
     results = []
 
-    for car_id, count in sorted_cars:
+    for score, car in ranked[:top_n]:
 
-        car = cars_col.find_one({"_id": ObjectId(car_id)})
+        car["reason"] = reason or f"{score} users also liked"
+
+        results.append(car)
+
+    return results
+
+
+def similar_cars(car_id, top_n=5):
+
+    model.start()
+
+    ranked = model.similar_cars(car_id, top_n)
+
+    cars = get_cars_by_ids([car for car, _ in ranked])
+
+    results = []
+
+    for (_, score), car in zip(ranked, cars):
 
         if not car:
             continue
 
-        car["_id"] = str(car["_id"])
-
-        car["reason"] = f"{count} users also liked"
+        car["similarity"] = score
 
         results.append(car)
 
-    return results
\ No newline at end of file
+    return results
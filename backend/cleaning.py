@@ -0,0 +1,376 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from catalog_store import (
+    CATALOG_DIR,
+    CATEGORICAL_COLUMNS,
+    NUMERIC_COLUMNS,
+    column_path,
+    int_type,
+    narrow_int,
+    write_dictionaries
+)
+from precompute import publish
+
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset")
+
+RAW_PATH = os.getenv("CLEAN_SOURCE", os.path.join(DATASET_DIR, "car_rental_dataset.csv"))
+CLEANED_PATH = os.path.join(DATASET_DIR, "car_rental_cleaned.csv")
+CBF_PATH = os.path.join(DATASET_DIR, "car_rental_cbf.csv")
+
+COLUMNAR_DIR = CATALOG_DIR
+
+CLEAN_CHUNK_ROWS = int(os.getenv("CLEAN_CHUNK_ROWS", 50000))
+
+# Same rules as notebooks/data cleaning.ipynb: missing text becomes
+# "unknown", missing numbers the column median.
+MISSING_TEXT = "unknown"
+FILLED_COLUMNS = ["Year", "Mileage", "Engine_CC"]
+
+# Whole numbers print without a trailing ".0", so a column reads the same
+# whether or not some chunk had a gap to fill.
+FLOAT_FORMAT = "%.10g"
+
+
+def read_chunks(path, chunk_rows=CLEAN_CHUNK_ROWS, usecols=None):
+
+    # Everything comes in as text; workers do the coercion, so each chunk
+    # gets the same rules whatever pandas would have inferred for it.
+    return pd.read_csv(path, dtype=str, chunksize=chunk_rows, usecols=usecols)
+
+
+def bounded_map(pool, fn, items, window):
+
+    # Like pool.map, but with at most window chunks in flight, so the
+    # reader never runs ahead of the workers by more than that.
+    pending = deque()
+
+    for item in items:
+
+        pending.append(pool.submit(fn, item))
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def distinct(column):
+
+    # Supplier columns repeat a handful of values millions of times, so
+    # every rule below runs on the distinct values only and is mapped back
+    # through the codes. Missing cells get a code of their own.
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+
+    return codes, pd.Series(uniques, dtype=object)
+
+
+def to_number(values):
+
+    # Surrounding whitespace is accepted; anything else unparseable is NaN.
+    return pd.to_numeric(values, errors="coerce")
+
+
+def value_counts(chunk):
+
+    counts = {}
+
+    for col in FILLED_COLUMNS:
+        if col in chunk:
+            raw = chunk[col].value_counts()
+            counts[col] = raw.groupby(to_number(pd.Series(raw.index, dtype=object)).to_numpy()).sum()
+
+    return counts
+
+
+def median_from_counts(counts):
+
+    # Exact median (the mean of the two middle values for an even count)
+    # from a value -> count table, so no pass holds the whole column.
+    if counts.empty:
+        return 0
+
+    counts = counts.sort_index()
+    cumulative = counts.cumsum().to_numpy()
+    total = cumulative[-1]
+
+    values = counts.index.to_numpy(dtype=np.float64)
+
+    low = values[np.searchsorted(cumulative, (total + 1) // 2)]
+    high = values[np.searchsorted(cumulative, total // 2 + 1)]
+
+    return (low + high) / 2
+
+
+def column_medians(path, pool, chunk_rows=CLEAN_CHUNK_ROWS, window=8):
+
+    header = pd.read_csv(path, nrows=0).columns
+
+    usecols = [col for col in FILLED_COLUMNS if col in header]
+
+    totals = {}
+
+    for counts in bounded_map(pool, value_counts, read_chunks(path, chunk_rows, usecols), window):
+        for col, series in counts.items():
+            totals[col] = series if col not in totals else totals[col].add(series, fill_value=0)
+
+    return {col: median_from_counts(series) for col, series in totals.items()}
+
+
+def numeric_column(values):
+
+    # Whole numbers go out as ints; the float format prints them the same
+    # way, so chunks agree whichever type they end up with.
+    if np.array_equal(values, np.floor(values)):
+        return values.astype(np.int64)
+
+    return values
+
+
+def clean_chunk(args):
+
+    chunk, medians, header = args
+
+    ids = None
+
+    # Rows without a Car_ID cannot be referenced anywhere, so they go.
+    if "Car_ID" in chunk:
+        ids = to_number(chunk["Car_ID"])
+        chunk = chunk[ids.notna()]
+        ids = ids[ids.notna()]
+
+    cleaned = {}
+    cbf = {}
+    codes = {}
+
+    for col in chunk.columns:
+
+        if col == "Car_ID":
+            cleaned[col] = cbf[col] = numeric_column(ids.to_numpy(dtype=np.float64))
+            continue
+
+        col_codes, uniques = distinct(chunk[col])
+
+        if col in CATEGORICAL_COLUMNS:
+
+            text = uniques.str.strip().replace("", np.nan).fillna(MISSING_TEXT)
+            lower = text.str.lower()
+
+            cleaned[col] = text.to_numpy(dtype=object)[col_codes]
+            cbf[col] = lower.to_numpy(dtype=object)[col_codes]
+
+            # The columnar form holds the CBF values; the parent merges
+            # these per-chunk dictionaries into one catalog.
+            codes[col] = (narrow_int(col_codes), lower.tolist())
+
+        elif col in FILLED_COLUMNS:
+
+            values = to_number(uniques).fillna(medians.get(col, 0))
+
+            cleaned[col] = cbf[col] = numeric_column(values.to_numpy(dtype=np.float64))[col_codes]
+
+        else:
+            cleaned[col] = cbf[col] = uniques.to_numpy(dtype=object)[col_codes]
+
+    numerics = {col: cleaned[col] for col in cleaned if col in NUMERIC_COLUMNS}
+
+    return (
+        len(chunk),
+        pd.DataFrame(cleaned).to_csv(index=False, header=header, float_format=FLOAT_FORMAT),
+        pd.DataFrame(cbf).to_csv(index=False, header=header, float_format=FLOAT_FORMAT),
+        codes,
+        numerics
+    )
+
+
+class CatalogBuilder:
+
+    # Writes each chunk's columns to part files as it arrives, recoded
+    # into one global dictionary per column (in order of first appearance,
+    # the same order pd.factorize gives on the whole frame). Only the
+    # dictionaries and each numeric column's range stay in memory, so a
+    # feed of any length costs one chunk of memory.
+    def __init__(self, path):
+
+        self.path = path
+
+        self.lookups = {}
+        self.ranges = {}
+        self.sizes = []
+
+    def part_path(self, col, part):
+
+        return os.path.join(self.path, f"{part:06d}_{col}.npy")
+
+    def add(self, count, codes, numerics):
+
+        part = len(self.sizes)
+
+        for col, (values, uniques) in codes.items():
+
+            lookup = self.lookups.setdefault(col, {})
+
+            remap = np.array(
+                [lookup.setdefault(value, len(lookup)) for value in uniques],
+                dtype=np.int64
+            )
+
+            np.save(self.part_path(col, part), remap[values])
+
+        for col, values in numerics.items():
+
+            low, high, whole = self.ranges.get(col, (None, None, True))
+
+            if len(values):
+                low = values.min() if low is None else min(low, values.min())
+                high = values.max() if high is None else max(high, values.max())
+                whole = whole and np.array_equal(values, np.floor(values))
+
+            self.ranges[col] = (low, high, whole)
+
+            np.save(self.part_path(col, part), values)
+
+        self.sizes.append(count)
+
+    def join(self, col, dtype, path):
+
+        out = np.lib.format.open_memmap(
+            column_path(path, col),
+            mode="w+",
+            dtype=dtype,
+            shape=(sum(self.sizes),)
+        )
+
+        start = 0
+
+        for part in range(len(self.sizes)):
+
+            values = np.load(self.part_path(col, part))
+            out[start:start + len(values)] = values.astype(dtype)
+            start += len(values)
+
+            os.remove(self.part_path(col, part))
+
+        out.flush()
+
+    def build(self, path):
+
+        # Same types ColumnarCatalog.from_frame picks: the narrowest int
+        # for codes and whole numbers, float32 for anything fractional.
+        for col, lookup in self.lookups.items():
+            self.join(col, int_type(0, len(lookup) - 1), path)
+
+        for col, (low, high, whole) in self.ranges.items():
+            if whole:
+                dtype = int_type(0, 0) if low is None else int_type(low, high)
+            else:
+                dtype = np.float32
+            self.join(col, dtype, path)
+
+        write_dictionaries(
+            path,
+            {col: list(lookup) for col, lookup in self.lookups.items()},
+            list(self.ranges)
+        )
+
+
+def clean(source=RAW_PATH, cleaned_path=CLEANED_PATH, cbf_path=CBF_PATH,
+          columnar_dir=COLUMNAR_DIR, workers=None, chunk_rows=CLEAN_CHUNK_ROWS):
+
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2
+
+    outputs = []
+
+    for path in (cleaned_path, cbf_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".csv")
+        outputs.append((open(fd, "w", newline=""), tmp, path))
+
+    # The catalog is built next to its destination and swapped in whole,
+    # as the model artifacts are.
+    catalog_tmp = None
+    builder = None
+
+    if columnar_dir:
+        parent = os.path.dirname(os.path.abspath(columnar_dir))
+        os.makedirs(parent, exist_ok=True)
+        catalog_tmp = tempfile.mkdtemp(dir=parent)
+        builder = CatalogBuilder(tempfile.mkdtemp(dir=catalog_tmp))
+
+    rows = 0
+
+    try:
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            # Medians need the whole column, so they take a cheap first
+            # pass over just the numeric columns.
+            medians = column_medians(source, pool, chunk_rows, window)
+
+            jobs = (
+                (chunk, medians, i == 0)
+                for i, chunk in enumerate(read_chunks(source, chunk_rows))
+            )
+
+            for count, cleaned, cbf, codes, numerics in bounded_map(pool, clean_chunk, jobs, window):
+
+                outputs[0][0].write(cleaned)
+                outputs[1][0].write(cbf)
+
+                if builder is not None:
+                    builder.add(count, codes, numerics)
+
+                rows += count
+
+        for f, _, _ in outputs:
+            f.close()
+
+        if builder is not None:
+            builder.build(catalog_tmp)
+            shutil.rmtree(builder.path)
+
+        # Swap the finished outputs in only once all of them are complete.
+        for _, tmp, path in outputs:
+            os.replace(tmp, path)
+
+        if builder is not None:
+            publish(catalog_tmp, columnar_dir)
+
+    finally:
+
+        for f, tmp, _ in outputs:
+            f.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        if catalog_tmp is not None:
+            shutil.rmtree(catalog_tmp, ignore_errors=True)
+
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Clean the car dataset into the cleaned, CBF and columnar forms")
+    parser.add_argument("--source", default=RAW_PATH)
+    parser.add_argument("--cleaned", default=CLEANED_PATH)
+    parser.add_argument("--cbf", default=CBF_PATH)
+    parser.add_argument("--columnar", default=COLUMNAR_DIR, help="Output directory for the columnar catalog ('' to skip)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-rows", type=int, default=CLEAN_CHUNK_ROWS)
+
+    args = parser.parse_args()
+
+    count = clean(args.source, args.cleaned, args.cbf, args.columnar, args.workers, args.chunk_rows)
+
+    print(f"{count} rows cleaned")
+    sys.exit(0)
@@ -12,4 +12,7 @@ db = client["car_rental_db"]
 
 users_col = db["users"]
 cars_col = db["cars"]
-interactions_col = db["interactions"]
\ No newline at end of file
+interactions_col = db["interactions"]
+meta_col = db["meta"]
+
+user_stats_col = db["user_stats"]
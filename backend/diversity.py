@@ -0,0 +1,150 @@
+import numpy as np
+
+
+# Re-ranking rules shared by the recommenders. Everything works on
+# positions into a score array, so callers map them back to their own rows
+# or car ids. Single-list rules only look at a top-k pool of the scores and
+# widen it when the pool runs out, instead of sorting every candidate.
+
+POOL_GROWTH = 4
+
+
+def top_positions(scores, k):
+
+    # Indices of the k best scores, best first; ties keep catalog order.
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(scores):
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        part = np.flatnonzero(scores >= kth)
+    else:
+        part = np.arange(len(scores))
+
+    order = np.lexsort((part, -scores[part]))
+
+    return part[order][:k]
+
+
+def distinct_top(scores, keys, needed, exclude=()):
+
+    # Best position per key, best first, skipping keys in exclude.
+    if needed <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    exclude = np.asarray(list(exclude), dtype=keys.dtype)
+
+    k = needed * 2
+
+    while True:
+
+        ranked = top_positions(scores, k)
+        ranked = ranked[~np.isin(keys[ranked], exclude)]
+
+        _, first = np.unique(keys[ranked], return_index=True)
+        picked = ranked[np.sort(first)][:needed]
+
+        if len(picked) == needed or k >= len(scores):
+            return picked
+
+        k *= POOL_GROWTH
+
+
+def capped_top(scores, groups, limit, top_n):
+
+    # Best top_n positions with at most limit from any one group.
+    if top_n <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    k = top_n * 2
+
+    while True:
+
+        ranked = top_positions(scores, k)
+        ranked_groups = groups[ranked]
+
+        # Rank of each position within its group, in score order.
+        order = np.argsort(ranked_groups, kind="stable")
+        sorted_groups = ranked_groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+        counts = np.diff(np.r_[starts, len(order)])
+
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order)) - np.repeat(starts, counts)
+
+        picked = ranked[rank < limit][:top_n]
+
+        if len(picked) == top_n or k >= len(scores):
+            return picked
+
+        k *= POOL_GROWTH
+
+
+def pin_then_distinct(scores, pinned, pin_limit, keys, top_n):
+
+    # Up to pin_limit of the best pinned positions, then the best unpinned
+    # position of each key the pinned ones have not already used.
+    if top_n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    pinned_pos = np.flatnonzero(pinned)
+    pinned_pos = pinned_pos[top_positions(scores[pinned_pos], pin_limit)]
+    pinned_pos = pinned_pos[:top_n]
+
+    other_pos = np.flatnonzero(~pinned)
+
+    picked = other_pos[distinct_top(
+        scores[other_pos],
+        keys[other_pos],
+        top_n - len(pinned_pos),
+        exclude=keys[pinned_pos].tolist()
+    )]
+
+    return np.concatenate([pinned_pos, picked])
+
+
+def pin_then_distinct_batch(scores, pinned, pin_limit, keys, n_keys, top_n):
+
+    # pin_then_distinct for a (profiles x positions) score matrix where
+    # every profile shares the same keys; pinned is per profile.
+    count, width = scores.shape
+
+    if top_n <= 0 or width == 0:
+        return [np.empty(0, dtype=np.intp)] * count
+
+    order = np.argsort(-scores, axis=1, kind="stable")
+
+    pinned = np.take_along_axis(pinned, order, axis=1)
+    keys = keys[order]
+
+    take_pinned = pinned & (np.cumsum(pinned, axis=1) <= pin_limit)
+
+    profile = np.arange(count)[:, None]
+
+    seen = np.zeros((count, n_keys), dtype=bool)
+    seen[np.nonzero(take_pinned)[0], keys[take_pinned]] = True
+
+    other = ~pinned & ~seen[profile, keys]
+
+    # Keep only the best scored position of each key within a profile.
+    flat_keys = (profile * n_keys + keys).ravel()
+    flat = np.flatnonzero(other.ravel())
+    _, first = np.unique(flat_keys[flat], return_index=True)
+
+    first_other = np.zeros(count * width, dtype=bool)
+    first_other[flat[first]] = True
+    first_other = first_other.reshape(count, width)
+
+    needed = top_n - take_pinned.sum(axis=1)
+
+    take_other = first_other & (
+        np.cumsum(first_other, axis=1) <= needed[:, None]
+    )
+
+    return [
+        np.concatenate([
+            order[i][take_pinned[i]],
+            order[i][take_other[i]]
+        ])[:top_n]
+        for i in range(count)
+    ]
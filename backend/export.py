@@ -0,0 +1,205 @@
+import io
+import os
+import sys
+import csv
+import json
+import hmac
+import argparse
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from db import interactions_col
+
+
+EXPORT_FIELDS = ["_id", "user_id", "car_id", "action", "timestamp"]
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", 5000))
+EXPORT_CSV_CHUNK = int(os.getenv("EXPORT_CSV_CHUNK", 1000))
+
+# Interactions get their _id when written, which is never before their
+# timestamp (the write-behind queue only delays it), so a since export can
+# skip _ids older than since minus this margin for clock skew.
+EXPORT_ID_MARGIN = timedelta(seconds=float(os.getenv("EXPORT_ID_MARGIN", 3600)))
+
+# The HTTP export is off unless a key is configured; callers send it as
+# X-API-Key.
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_since(value):
+
+    # ISO 8601, with or without an offset ("Z" included); stored
+    # timestamps are naive UTC.
+    if not value:
+        return None
+
+    try:
+        since = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid since: {value}")
+
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return since
+
+
+def parse_after(value):
+
+    if not value:
+        return None
+
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid after: {value}")
+
+
+def iter_interactions(collection=interactions_col, since=None, after=None, page_size=EXPORT_PAGE_SIZE):
+
+    # Keyset pagination on _id: every page is a short, independent query
+    # that walks the _id index from where the last one stopped, so memory
+    # stays at one page however large the collection is.
+    projection = {field: 1 for field in EXPORT_FIELDS}
+
+    base = {}
+
+    last = after
+
+    if since is not None:
+
+        base["timestamp"] = {"$gt": since}
+
+        floor = ObjectId.from_datetime(since - EXPORT_ID_MARGIN)
+
+        if last is None or last < floor:
+            last = floor
+
+    while True:
+
+        query = dict(base)
+
+        if last is not None:
+            query["_id"] = {"$gt": last}
+
+        page = list(
+            collection.find(query, projection)
+            .sort("_id", 1)
+            .hint([("_id", 1)])
+            .limit(page_size)
+        )
+
+        yield from page
+
+        if len(page) < page_size:
+            return
+
+        last = page[-1]["_id"]
+
+
+def format_timestamp(value):
+
+    if not isinstance(value, datetime):
+        return value
+
+    # Same form as the dataset dump: millisecond precision, Z suffix.
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def to_record(doc):
+
+    record = {}
+
+    for field in EXPORT_FIELDS:
+
+        value = doc.get(field)
+
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif field == "timestamp":
+            value = format_timestamp(value)
+
+        record[field] = value
+
+    return record
+
+
+def ndjson_lines(docs):
+
+    for doc in docs:
+        yield json.dumps(to_record(doc), separators=(",", ":"), default=str) + "\n"
+
+
+def csv_chunks(docs, rows_per_chunk=EXPORT_CSV_CHUNK):
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator="\n")
+
+    writer.writeheader()
+
+    rows = 0
+
+    for doc in docs:
+
+        writer.writerow(to_record(doc))
+        rows += 1
+
+        if rows % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_stream(fmt="ndjson", since=None, after=None, collection=interactions_col):
+
+    # (chunks, mimetype); raises ValueError on bad arguments before any
+    # query runs, so routes can still answer 400.
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    docs = iter_interactions(
+        collection,
+        since=parse_since(since),
+        after=parse_after(after)
+    )
+
+    chunks = ndjson_lines(docs) if fmt == "ndjson" else csv_chunks(docs)
+
+    return chunks, FORMATS[fmt]
+
+
+def export_allowed(key):
+
+    if not EXPORT_API_KEY:
+        return False
+
+    return hmac.compare_digest(str(key or ""), EXPORT_API_KEY)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Stream interactions as NDJSON or CSV")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--since", help="Only interactions after this ISO timestamp")
+    parser.add_argument("--after", help="Resume after this interaction _id")
+    parser.add_argument("--out", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    chunks, _ = export_stream(args.format, since=args.since, after=args.after)
+
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
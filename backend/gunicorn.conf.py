@@ -0,0 +1,9 @@
+from model_artifacts import ensure_artifacts
+
+
+def on_starting(server):
+
+    # Build the model artifacts once in the master, before any worker is
+    # forked. Workers then memory-map the same read-only files, so the
+    # catalog and TF-IDF arrays sit in the page cache once, not per worker.
+    ensure_artifacts()
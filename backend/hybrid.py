@@ -0,0 +1,202 @@
+import os
+import math
+import threading
+import numpy as np
+from catalog_cache import catalog
+from cf_recommender import model as cf_model, rank_cf
+from diversity import pin_then_distinct
+from recommender import SAME_BRAND_LIMIT, get_engine, query_text
+
+
+# Default blend; a request can override any of these.
+HYBRID_WEIGHTS = {
+    "content": float(os.getenv("HYBRID_CONTENT_WEIGHT", 0.6)),
+    "cf": float(os.getenv("HYBRID_CF_WEIGHT", 0.3)),
+    "popularity": float(os.getenv("HYBRID_POPULARITY_WEIGHT", 0.1)),
+}
+
+# How many of the CF model's best cars feed the cf signal.
+HYBRID_CF_POOL = int(os.getenv("HYBRID_CF_POOL", 50))
+
+
+def resolve_weights(overrides=None):
+
+    weights = dict(HYBRID_WEIGHTS)
+
+    for name, value in (overrides or {}).items():
+
+        if name not in weights:
+            raise ValueError(f"Unknown weight: {name}")
+
+        value = float(value)
+
+        # float() accepts "nan" and "inf", which would poison every score.
+        if not math.isfinite(value):
+            raise ValueError(f"Weight must be a finite number: {name}")
+
+        if value < 0:
+            raise ValueError(f"Weight must not be negative: {name}")
+
+        weights[name] = value
+
+    if sum(weights.values()) <= 0:
+        raise ValueError("At least one weight must be positive")
+
+    return weights
+
+
+class CarPairs:
+
+    # Catalog (Brand, Model) pair of every car the CF model knows, by CF
+    # position. The CF car list only grows, so new cars are appended; the
+    # table starts over when the catalog or the CBF artifact changes.
+    # (key, by_id, codes) is replaced whole and never changed in place, so
+    # requests read it without the lock; only a rebuild or append takes it.
+    def __init__(self):
+
+        self.lock = threading.Lock()
+
+        self.table = (None, {}, np.empty(0, dtype=np.int64))
+
+    def get(self, engine, snapshot, cars):
+
+        key = (snapshot.etag, engine.version)
+        count = len(cars)
+
+        table_key, _, codes = self.table
+
+        if table_key == key and len(codes) >= count:
+            return codes
+
+        with self.lock:
+
+            table_key, by_id, codes = self.table
+
+            if table_key != key:
+
+                by_id = {
+                    car["_id"]: engine.pair_code(
+                        car.get("Brand", ""),
+                        car.get("Model", "")
+                    )
+                    for car in snapshot.cars
+                }
+
+                codes = np.empty(0, dtype=np.int64)
+
+            if len(codes) < count:
+
+                extra = [
+                    by_id.get(car, -1)
+                    for car in cars[len(codes):count]
+                ]
+
+                codes = np.concatenate([
+                    codes,
+                    np.asarray(extra, dtype=np.int64)
+                ])
+
+            self.table = (key, by_id, codes)
+
+            return codes
+
+
+car_pairs = CarPairs()
+
+
+def normalise(values):
+
+    peak = values.max() if len(values) else 0
+
+    if peak <= 0:
+        return np.zeros(len(values))
+
+    return values / peak
+
+
+def recommend_hybrid(prefs, user_id=None, top_n=5, weights=None):
+
+    weights = resolve_weights(weights)
+
+    engine = get_engine()
+
+    user_brand, user_text = query_text(prefs)
+
+    n_pairs = len(engine.catalog.dictionaries["Brand"]) * engine.n_models
+
+    cf_model.start()
+
+    # Read the CF state once; refresh() publishes a new one wholesale.
+    state = cf_model.state
+    cars = state.cars
+    popularity = state.popularity
+
+    pairs = car_pairs.get(engine, catalog.get(), cars)[:len(popularity)]
+    known = pairs >= 0
+
+    pair_popularity = np.bincount(
+        pairs[known],
+        weights=popularity[known],
+        minlength=n_pairs
+    )
+
+    pair_cf = np.zeros(n_pairs)
+
+    if user_id is not None and weights["cf"] > 0:
+
+        # Whichever CF_MODEL serves /api/recommend; ALS scores can be
+        # negative, and a negative score is no support for a car.
+        ranked, _ = rank_cf(user_id, HYBRID_CF_POOL)
+
+        for car_id, score in ranked:
+
+            pos = state.car_index.get(car_id)
+
+            if pos is not None and pos < len(pairs) and pairs[pos] >= 0:
+                pair_cf[pairs[pos]] += max(score, 0)
+
+    # Candidates: the content generator's filtered rows, plus one row for
+    # every pair the CF neighbours liked that the filters left out.
+    rows = engine.candidate_rows(prefs)
+
+    extra = sorted(
+        engine.pair_rows[code]
+        for code in set(np.flatnonzero(pair_cf).tolist()) -
+        set(engine.pair_codes[rows].tolist())
+        if code in engine.pair_rows
+    )
+
+    if extra:
+        rows = np.concatenate([rows, np.asarray(extra, dtype=rows.dtype)])
+
+    row_pairs = engine.pair_codes[rows]
+
+    contributions = {
+        "content": weights["content"] * (
+            engine.similarity(user_text)[rows] * 0.7 +
+            engine.numeric_score[rows] * 0.3
+        ),
+        "cf": weights["cf"] * normalise(pair_cf[row_pairs]),
+        "popularity": weights["popularity"] * normalise(
+            pair_popularity[row_pairs]
+        ),
+    }
+
+    scores = sum(contributions.values())
+
+    positions = pin_then_distinct(
+        scores,
+        engine.brand_codes[rows] == engine.catalog.code("Brand", user_brand),
+        SAME_BRAND_LIMIT,
+        engine.model_codes[rows],
+        top_n
+    )
+
+    results = engine.records(rows[positions], scores[positions])
+
+    for record, pos in zip(results, positions.tolist()):
+        record["contributions"] = {
+            name: float(values[pos]) for name, values in contributions.items()
+        }
+
+    return results
@@ -0,0 +1,115 @@
+import sys
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+from db import db
+
+
+logger = logging.getLogger(__name__)
+
+
+# Created by `python indexes.py`, run as a deploy step; the app never
+# builds indexes itself, so a worker can start while Mongo is away.
+# collection -> list of (keys, options)
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+    ],
+    "interactions": [
+        ([("user_id", ASCENDING), ("action", ASCENDING), ("timestamp", ASCENDING)], {}),
+        ([("timestamp", ASCENDING)], {}),
+    ],
+    # Seeding upserts on (Brand, Model); /api/cars pages come from the
+    # in-memory catalog snapshot and need no filter indexes.
+    "cars": [
+        ([("Brand", ASCENDING), ("Model", ASCENDING)], {}),
+    ],
+}
+
+
+def ensure_indexes(database=db):
+
+    # The (collection, keys) pairs that could not be created. An
+    # unreachable server would fail every one after a full selection
+    # timeout, so the first connection failure ends the run.
+    failures = []
+
+    for name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                database[name].create_index(keys, **options)
+            except ConnectionFailure as e:
+                logger.error("Could not reach MongoDB to create indexes: %s", e)
+                failures.append((name, keys))
+                return failures
+            except PyMongoError as e:
+                logger.error("Could not create index %s on %s: %s", keys, name, e)
+                failures.append((name, keys))
+
+    return failures
+
+
+def hot_queries(database=db):
+
+    user_id = ObjectId()
+
+    return [
+        ("login lookup", database["users"].find({"email": "probe@example.com"})),
+        ("user stats", database["user_stats"].find({"_id": user_id})),
+        ("user interactions", database["interactions"].find({
+            "user_id": user_id,
+            "action": "book"
+        })),
+        ("CF refresh", database["interactions"].find({
+            "car_id": {"$exists": True, "$ne": None},
+            "_id": {"$gt": ObjectId.from_datetime(datetime(2000, 1, 1))}
+        }).sort("_id", 1)),
+        ("seed upsert", database["cars"].find({"Brand": "Kia", "Model": "Rio"})),
+    ]
+
+
+def plan_stages(plan):
+
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+def check_query_plans(database=db):
+
+    failures = []
+
+    for name, cursor in hot_queries(database):
+
+        winning = cursor.explain()["queryPlanner"]["winningPlan"]
+
+        if "COLLSCAN" in plan_stages(winning):
+            failures.append(name)
+
+    return failures
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    # --check only reads query plans, so it is safe against a live database.
+    if "--check" in sys.argv:
+
+        failures = check_query_plans()
+
+        for name in failures:
+            print(f"COLLSCAN: {name}")
+
+    else:
+        failures = ensure_indexes()
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,197 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from pymongo.errors import BulkWriteError
+from db import interactions_col
+from user_stats import record_interactions
+
+
+QUEUE_SIZE = int(os.getenv("INTERACTION_QUEUE_SIZE", 10000))
+FLUSH_SIZE = int(os.getenv("INTERACTION_FLUSH_SIZE", 500))
+FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", 1.0))
+ENQUEUE_TIMEOUT = float(os.getenv("INTERACTION_ENQUEUE_TIMEOUT", 0.05))
+
+logger = logging.getLogger(__name__)
+
+
+class InteractionQueue:
+
+    def __init__(
+        self,
+        collection,
+        maxsize=QUEUE_SIZE,
+        flush_size=FLUSH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        enqueue_timeout=ENQUEUE_TIMEOUT,
+        on_flush=None
+    ):
+
+        self.collection = collection
+        self.on_flush = on_flush
+        self.buffer = queue.Queue(maxsize)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        self.metrics = {
+            "enqueued": 0,
+            "blocked": 0,
+            "dropped": 0,
+            "flushed": 0,
+            "failed": 0,
+            "flushes": 0,
+            "max_depth": 0
+        }
+
+    def start(self):
+
+        if self.thread is not None:
+            return
+
+        with self.lock:
+
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name="interaction-writer",
+                    daemon=True
+                )
+                self.thread.start()
+
+    def count(self, name, n=1):
+
+        with self.lock:
+            self.metrics[name] += n
+
+    def put(self, doc):
+
+        self.start()
+
+        try:
+            self.buffer.put_nowait(doc)
+        except queue.Full:
+
+            # Backpressure: wait briefly for the writer, then shed the
+            # event rather than stall the request.
+            self.count("blocked")
+
+            try:
+                self.buffer.put(doc, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self.count("dropped")
+                return False
+
+        with self.lock:
+            self.metrics["enqueued"] += 1
+            self.metrics["max_depth"] = max(
+                self.metrics["max_depth"], self.buffer.qsize()
+            )
+
+        return True
+
+    def collect(self):
+
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.flush_size:
+
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(self.buffer.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def write(self, batch):
+
+        inserted = []
+
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            inserted = batch
+
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted = [doc for i, doc in enumerate(batch) if i not in failed]
+            logger.error("Interaction flush partially failed: %s", e)
+
+        except Exception:
+            logger.exception("Interaction flush failed")
+
+        self.count("flushed", len(inserted))
+        self.count("failed", len(batch) - len(inserted))
+        self.count("flushes")
+
+        # Stats follow only what actually landed, and a failure there
+        # does not change what the flush itself reports.
+        if inserted and self.on_flush is not None:
+            try:
+                self.on_flush(inserted)
+            except Exception:
+                logger.exception("Interaction stats update failed")
+
+    def run(self):
+
+        while not self.stopping.is_set():
+
+            batch = self.collect()
+
+            if batch:
+                self.write(batch)
+
+    def flush(self):
+
+        while True:
+
+            batch = []
+
+            while len(batch) < self.flush_size:
+                try:
+                    batch.append(self.buffer.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not batch:
+                return
+
+            self.write(batch)
+
+    def stop(self, timeout=5):
+
+        self.stopping.set()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+        self.flush()
+
+    def stats(self):
+
+        with self.lock:
+            stats = dict(self.metrics)
+
+        stats["depth"] = self.buffer.qsize()
+        stats["capacity"] = self.buffer.maxsize
+
+        return stats
+
+
+interaction_queue = InteractionQueue(
+    interactions_col,
+    on_flush=record_interactions
+)
+
+atexit.register(interaction_queue.stop)
@@ -1,12 +1,44 @@
+import os
+import logging
 from db import interactions_col
+from interaction_queue import interaction_queue
+from user_stats import record_interactions
 from datetime import datetime
 
 
-def log_interaction(user_id, car_id=None, action="view"):
+# How much each action says about a user's interest in a car; the ALS
+# model turns these into confidence (see als.py).
+ACTION_WEIGHTS = {
+    "book": float(os.getenv("CF_WEIGHT_BOOK", 10)),
+    "view": float(os.getenv("CF_WEIGHT_VIEW", 2)),
+    "search": float(os.getenv("CF_WEIGHT_SEARCH", 0.5)),
+}
+
+ALLOWED_ACTIONS = ("view", "book", "search")
+
+logger = logging.getLogger(__name__)
+
+
+def store_interaction(doc):
 
-    allowed_actions = ["view", "book", "search"]
+    # Bookings are written synchronously; other events go through the
+    # write-behind queue so they never add a Mongo round-trip.
+    if doc["action"] == "book":
+        interactions_col.insert_one(doc)
+
+        # The booking is stored at this point; a failed stats update must
+        # not make the caller report failure and book again.
+        try:
+            record_interactions([doc])
+        except Exception:
+            logger.exception("Booking stats update failed")
+    else:
+        interaction_queue.put(doc)
+
+
+def log_interaction(user_id, car_id=None, action="view"):
 
-    if action not in allowed_actions:
+    if action not in ALLOWED_ACTIONS:
         raise ValueError(f"Invalid interaction action: {action}")
 
     doc = {
@@ -18,12 +50,12 @@ def log_interaction(user_id, car_id=None, action="view"):
     if car_id:
         doc["car_id"] = car_id
 
-    interactions_col.insert_one(doc)
+    store_interaction(doc)
 
 
 def log_booking_interaction(user_id, car_id):
 
-    interactions_col.insert_one({
+    store_interaction({
         "user_id": user_id,
         "car_id": car_id,
         "action": "book",
@@ -0,0 +1,158 @@
+import os
+import numpy as np
+from scipy import sparse
+
+
+ITEM_NEIGHBOURS = int(os.getenv("CF_ITEM_NEIGHBOURS", 20))
+
+
+def top_k_rows(similarity, k):
+
+    # Best k entries of every row of a CSR matrix, as (rows, cols, scores)
+    # sorted by row then score; ties keep the lower column first.
+    similarity = similarity.tocoo()
+
+    rows = similarity.row
+    cols = similarity.col
+    data = similarity.data
+
+    order = np.lexsort((cols, -data, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    rank = np.arange(len(rows)) - np.repeat(starts, counts)
+
+    keep = rank < k
+
+    return rows[keep], cols[keep], data[keep], rank[keep]
+
+
+class ItemNeighbours:
+
+    # Cosine top-k neighbours of every car over the user x car matrix,
+    # held as fixed-width arrays: row i lists car i's neighbours by CF car
+    # position, best first, padded with -1.
+    def __init__(self, k=ITEM_NEIGHBOURS):
+
+        self.k = k
+
+        self.table = (
+            np.empty((0, k), dtype=np.int32),
+            np.empty((0, k), dtype=np.float32)
+        )
+
+    def similarities(self, matrix_t, norms, items):
+
+        # Rows of the item-item cosine matrix for the given items,
+        # without each item's similarity to itself.
+        sims = (matrix_t[items] @ matrix_t.T).tocsr()
+
+        scale = 1 / np.maximum(norms[items], 1e-12)
+        sims = sparse.diags(scale) @ sims @ sparse.diags(
+            1 / np.maximum(norms, 1e-12)
+        )
+        sims = sims.tocoo()
+
+        keep = items[sims.row] != sims.col
+
+        return sparse.csr_matrix(
+            (sims.data[keep], (sims.row[keep], sims.col[keep])),
+            shape=sims.shape
+        )
+
+    def rebuild(self, matrix):
+
+        self.update(matrix, np.arange(matrix.shape[1]))
+
+    def update(self, matrix, items):
+
+        # A new interaction on car i changes its norm, so it changes car i's
+        # row and the entry for i in the row of every car sharing a user
+        # with it; recompute exactly those rows.
+        matrix_t = matrix.T.tocsr().astype(np.float64)
+        norms = np.sqrt(np.asarray(matrix_t.multiply(matrix_t).sum(axis=1)).ravel())
+
+        items = np.asarray(items, dtype=np.int64)
+
+        touched = np.union1d(
+            items,
+            (matrix_t[items] @ matrix_t.T).tocsr().indices
+        ).astype(np.int64)
+
+        neighbours, scores = self.table
+
+        n_items = matrix.shape[1]
+
+        if neighbours.shape[0] < n_items:
+
+            extra = n_items - neighbours.shape[0]
+
+            neighbours = np.vstack([
+                neighbours,
+                np.full((extra, self.k), -1, dtype=np.int32)
+            ])
+            scores = np.vstack([
+                scores,
+                np.zeros((extra, self.k), dtype=np.float32)
+            ])
+        else:
+            neighbours = neighbours.copy()
+            scores = scores.copy()
+
+        rows, cols, data, rank = top_k_rows(
+            self.similarities(matrix_t, norms, touched),
+            self.k
+        )
+
+        neighbours[touched] = -1
+        scores[touched] = 0
+
+        neighbours[touched[rows], rank] = cols
+        scores[touched[rows], rank] = data
+
+        # Swapped as one tuple so readers see both arrays of the same build.
+        self.table = (neighbours, scores)
+
+    def similar(self, item, top_n):
+
+        neighbours, scores = self.table
+
+        if item >= neighbours.shape[0]:
+            return []
+
+        keep = neighbours[item] >= 0
+
+        return list(zip(
+            neighbours[item][keep][:top_n].tolist(),
+            scores[item][keep][:top_n].tolist()
+        ))
+
+    def recommend(self, recent, seen, top_n):
+
+        # Sum the neighbour lists of the user's recent cars and drop cars
+        # the user already interacted with.
+        neighbours, scores = self.table
+
+        recent = np.asarray(
+            [i for i in recent if i < neighbours.shape[0]],
+            dtype=np.int64
+        )
+
+        if len(recent) == 0:
+            return []
+
+        items = neighbours[recent].ravel()
+        sims = scores[recent].ravel()
+
+        keep = (items >= 0) & ~np.isin(items, seen)
+
+        candidates, inverse = np.unique(items[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=sims[keep])
+
+        order = np.lexsort((candidates, -totals))[:top_n]
+
+        return list(zip(
+            candidates[order].tolist(),
+            totals[order].tolist()
+        ))
@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+
+# Closed-loop load generator: every connection sends its next request as
+# soon as the previous answer arrives. Run it against the gunicorn/Flask
+# server and the uvicorn/ASGI server with the same arguments to compare.
+
+DEFAULT_BODY = {
+    "preferences": {
+        "Brand": "Toyota",
+        "Fuel_Type": "Petrol",
+        "Body_Type": "SUV",
+        "Mileage": "Medium",
+        "Engine_CC": "Medium Power"
+    }
+}
+
+
+def percentile(values, q):
+
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def worker(url, method, path, body, deadline, latencies, errors, lock):
+
+    parts = urlsplit(url)
+
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    headers = {"Content-Type": "application/json"}
+
+    own_latencies = []
+    own_errors = 0
+
+    while time.monotonic() < deadline:
+
+        start = time.perf_counter()
+
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+
+            if response.status >= 400:
+                own_errors += 1
+
+        except (OSError, http.client.HTTPException):
+            own_errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            continue
+
+        own_latencies.append(time.perf_counter() - start)
+
+    conn.close()
+
+    with lock:
+        latencies.extend(own_latencies)
+        errors.append(own_errors)
+
+
+def run(url, method, path, body, concurrency, duration):
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    deadline = time.monotonic() + duration
+
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, method, path, body, deadline, latencies, errors, lock)
+        )
+        for _ in range(concurrency)
+    ]
+
+    started = time.monotonic()
+
+    for t in threads:
+        t.start()
+
+    for t in threads:
+        t.join()
+
+    elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load-test one API route")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", default="/api/recommend")
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--body", help="JSON request body (default: a /api/recommend payload)")
+    parser.add_argument("--user-id", help="Add this user_id to the default body")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    if args.body is not None:
+        payload = json.loads(args.body)
+    else:
+        payload = dict(DEFAULT_BODY)
+        if args.user_id:
+            payload["user_id"] = args.user_id
+
+    body = json.dumps(payload) if args.method != "GET" else None
+
+    result = run(args.url, args.method, args.path, body, args.concurrency, args.duration)
+
+    json.dump(result, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from scipy import sparse
+from catalog_store import (
+    CATALOG_DIR,
+    CC_EDGES,
+    HAS_ARROW,
+    MILEAGE_EDGES,
+    ColumnarCatalog,
+    band_codes,
+    narrow_int
+)
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CBF_CSV_PATH = os.path.join(BACKEND_DIR, "dataset", "car_rental_cbf.csv")
+
+# Either the CBF CSV or the columnar catalog cleaning.py writes; the
+# catalog is used once it has been built, as it loads without parsing.
+DATASET_PATH = os.getenv(
+    "CBF_DATASET",
+    CATALOG_DIR if os.path.exists(os.path.join(CATALOG_DIR, "col_dictionaries.json")) else CBF_CSV_PATH
+)
+
+ARTIFACT_ROOT = os.getenv(
+    "MODEL_ARTIFACT_DIR",
+    os.path.join(BACKEND_DIR, "artifacts", "model")
+)
+
+OUTPUT_COLUMNS = [
+    "Car_ID",
+    "Brand",
+    "Model",
+    "Year",
+    "Fuel_Type",
+    "Body_Type",
+    "Mileage",
+    "Engine_CC"
+]
+
+# Bumped whenever the on-disk layout changes, so stale directories are
+# rebuilt rather than misread.
+ARTIFACT_FORMAT = 3
+
+TEXT_COLUMNS = ["Brand", "Fuel_Type", "Body_Type"]
+
+# Same tokens TfidfVectorizer's default token_pattern produces.
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def dataset_fingerprint(path):
+
+    digest = hashlib.sha256()
+
+    # A catalog directory hashes as its files, by name, in name order.
+    if os.path.isdir(path):
+        files = sorted(os.listdir(path))
+    else:
+        files = [None]
+
+    for name in files:
+
+        if name is not None:
+            digest.update(name.encode("utf-8"))
+
+        with open(path if name is None else os.path.join(path, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+    return digest.hexdigest()
+
+
+class QueryVectorizer:
+
+    # Reproduces the fitted TfidfVectorizer's transform (raw term counts,
+    # idf weighting, l2 norm) from its vocabulary and idf alone, so serving
+    # never imports sklearn. Stop words are absent from the vocabulary and
+    # so drop out of the lookup.
+
+    def __init__(self, vocabulary, idf):
+
+        self.vocabulary = vocabulary
+        self.idf = idf
+
+    def transform(self, texts):
+
+        indptr = [0]
+        indices = []
+        data = []
+
+        for text in texts:
+
+            counts = {}
+
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                term = self.vocabulary.get(token)
+                if term is not None:
+                    counts[term] = counts.get(term, 0) + 1
+
+            for term in sorted(counts):
+                indices.append(term)
+                data.append(counts[term] * self.idf[term])
+
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), indices, indptr),
+            shape=(len(texts), len(self.idf))
+        )
+
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+
+        return matrix
+
+
+def artifact_path(dataset=DATASET_PATH, root=ARTIFACT_ROOT):
+
+    version = dataset_fingerprint(dataset)[:16]
+
+    return version, os.path.join(root, f"v{ARTIFACT_FORMAT}-{version}")
+
+
+def build_artifacts(dataset=DATASET_PATH, root=ARTIFACT_ROOT):
+
+    import pandas as pd
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+
+    version, path = artifact_path(dataset, root)
+
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        return path
+
+    if os.path.isdir(dataset):
+
+        # cleaning.py's output: already lowercased, gaps already filled.
+        catalog = ColumnarCatalog.load(dataset)
+
+    else:
+
+        df = pd.read_csv(dataset)
+
+        df.fillna("", inplace=True)
+
+        for col in TEXT_COLUMNS:
+            df[col] = df[col].astype(str).str.lower()
+
+        catalog = ColumnarCatalog.from_frame(df)
+
+    # The text only varies with (Brand, Fuel_Type, Body_Type), so fit on the
+    # distinct combinations and weight each by how many rows share it.
+    combos, combo_rows = np.unique(
+        np.stack([catalog.codes[col] for col in TEXT_COLUMNS], axis=1),
+        axis=0,
+        return_inverse=True
+    )
+    combo_rows = combo_rows.ravel()
+
+    texts = [
+        " ".join(
+            catalog.dictionaries[col][code]
+            for col, code in zip(TEXT_COLUMNS, combo)
+        )
+        for combo in combos.tolist()
+    ]
+
+    counter = CountVectorizer(stop_words="english")
+    counts = counter.fit_transform(texts).astype(np.float64).tocsr()
+
+    weights = np.bincount(combo_rows, minlength=len(texts))
+    doc_freq = np.asarray((counts > 0).T @ weights, dtype=np.float64).ravel()
+
+    # Smoothed idf and l2-normalised rows, the same formula TfidfVectorizer uses.
+    idf = np.log((len(combo_rows) + 1) / (doc_freq + 1)) + 1
+
+    counts.data *= idf[counts.indices]
+    tfidf_matrix = normalize(counts, norm="l2")[combo_rows]
+
+    os.makedirs(root, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=root)
+
+    mileage = catalog.numerics["Mileage"].astype(np.float64)
+    engine_cc = catalog.numerics["Engine_CC"].astype(np.float64)
+
+    brand_codes = catalog.codes["Brand"]
+    model_codes = catalog.codes["Model"]
+
+    # The engine scores against the transpose, so store it in CSR form;
+    # its raw components can then be memory-mapped as-is.
+    matrix_t = tfidf_matrix.T.tocsr()
+    matrix_t.sort_indices()
+
+    arrays = {
+        # Kept in float64: it is added straight into the final score.
+        "numeric_score": (
+            (mileage / mileage.max()) * 0.3 +
+            (engine_cc / engine_cc.max()) * 0.2
+        ),
+        "mileage_band": band_codes(mileage, MILEAGE_EDGES),
+        "cc_band": band_codes(engine_cc, CC_EDGES),
+        "pair_codes": narrow_int(
+            brand_codes.astype(np.int64) * len(catalog.dictionaries["Model"]) +
+            model_codes
+        ),
+        "idf": idf,
+        "matrix_t_data": matrix_t.data,
+        "matrix_t_indices": matrix_t.indices.astype(np.int32),
+        "matrix_t_indptr": matrix_t.indptr.astype(np.int32),
+    }
+
+    catalog.save(tmp)
+
+    if HAS_ARROW:
+        catalog.write_parquet(os.path.join(tmp, "catalog.parquet"))
+
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, name + ".npy"), values)
+
+    with open(os.path.join(tmp, "vocabulary.json"), "w") as f:
+        json.dump({t: int(i) for t, i in counter.vocabulary_.items()}, f)
+
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "dataset": os.path.basename(dataset),
+            "rows": len(catalog),
+            "matrix_t_shape": list(matrix_t.shape)
+        }, f)
+
+    # Publish the finished directory in one rename so a worker never sees
+    # half an artifact.
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return path
+
+
+def load_artifacts(path):
+
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    with open(os.path.join(path, "vocabulary.json")) as f:
+        vocabulary = json.load(f)
+
+    def array(name):
+        return np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+
+    features = {
+        "numeric_score": array("numeric_score"),
+        "mileage_band": array("mileage_band"),
+        "cc_band": array("cc_band"),
+        "pair_codes": array("pair_codes"),
+        "catalog": ColumnarCatalog.load(path),
+    }
+
+    return {
+        "version": manifest["version"],
+        "vectorizer": QueryVectorizer(vocabulary, np.asarray(array("idf"))),
+        # Built straight on the read-only maps: every worker shares the
+        # same page-cache pages instead of holding its own copy.
+        "matrix_t": sparse.csr_matrix(
+            (
+                array("matrix_t_data"),
+                array("matrix_t_indices"),
+                array("matrix_t_indptr")
+            ),
+            shape=tuple(manifest["matrix_t_shape"]),
+            copy=False
+        ),
+        "features": features,
+    }
+
+
+def ensure_artifacts(dataset=DATASET_PATH, root=ARTIFACT_ROOT):
+
+    _, path = artifact_path(dataset, root)
+
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        path = build_artifacts(dataset, root)
+
+    return path
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build the CBF model artifacts")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--root", default=ARTIFACT_ROOT)
+
+    args = parser.parse_args()
+
+    print(build_artifacts(args.dataset, args.root))
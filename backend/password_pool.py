@@ -0,0 +1,116 @@
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import bcrypt
+
+
+# Cost of new hashes; existing hashes keep the cost they were made with.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Hash/check jobs allowed in flight (running or queued) per process before
+# new ones are refused outright.
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", PASSWORD_WORKERS * 8))
+
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", 10))
+
+# Forking a process that already runs request threads can copy a lock
+# some other thread holds; pool workers start from a clean process
+# instead. Only this module is preloaded, not the app that imports it.
+PASSWORD_START_METHOD = os.getenv(
+    "PASSWORD_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def hash_job(password, rounds):
+
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def check_job(password, hashed):
+
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordPool:
+
+    # bcrypt runs in separate processes so a burst of logins burns those
+    # cores instead of the threads serving every other route.
+    def __init__(self, workers=PASSWORD_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT, timeout=PASSWORD_TIMEOUT):
+
+        self.workers = workers
+        self.timeout = timeout
+
+        self.context = multiprocessing.get_context(PASSWORD_START_METHOD)
+
+        if PASSWORD_START_METHOD == "forkserver":
+            self.context.set_forkserver_preload([__name__])
+
+        self.slots = threading.BoundedSemaphore(queue_limit)
+        self.lock = threading.Lock()
+        self.executor = None
+
+        self.rejected = 0
+
+    def get_executor(self):
+
+        # Created on first use, so each gunicorn worker gets its own pool
+        # after the fork.
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=self.context
+                    )
+
+        return self.executor
+
+    def run(self, fn, *args):
+
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise PasswordPoolBusy("Password queue is full")
+
+        try:
+            future = self.get_executor().submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self.slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordPoolBusy("Password check timed out")
+
+    def hash(self, password, rounds=BCRYPT_ROUNDS):
+
+        return self.run(hash_job, password.encode("utf-8"), rounds)
+
+    def check(self, password, hashed):
+
+        return self.run(check_job, password.encode("utf-8"), hashed)
+
+    def shutdown(self):
+
+        with self.lock:
+            executor, self.executor = self.executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordPool()
+
+atexit.register(password_pool.shutdown)
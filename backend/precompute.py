@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import argparse
+import itertools
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+PRECOMPUTED_DIR = os.getenv(
+    "PRECOMPUTED_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts", "precomputed")
+)
+
+PRECOMPUTE_TOP_N = 10
+
+# Serving workers look for a newer build at most this often (seconds).
+PRECOMPUTED_RELOAD_INTERVAL = float(os.getenv("PRECOMPUTED_RELOAD_INTERVAL", 30))
+
+# The choices offered by preferences_page in frontend/streamlit_app.py.
+PREFERENCE_GRID = {
+    "Brand": ["Select your choice", "Kia", "Honda", "Toyota", "BMW", "Hyundai", "Maruti"],
+    "Fuel_Type": ["Select your choice", "Petrol", "Diesel", "Electric"],
+    "Body_Type": ["Select your choice", "SUV", "Sedan", "Hatchback"],
+    "Mileage": ["Select your choice", "Any", "Low", "Medium", "High"],
+    "Engine_CC": ["Select your choice", "Any", "Low Power", "Medium Power", "High Power"],
+}
+
+logger = logging.getLogger(__name__)
+
+
+class PrecomputedRecommendations:
+
+    def __init__(self, path):
+
+        with open(os.path.join(path, "keys.json")) as f:
+            meta = json.load(f)
+
+        self.version = meta["version"]
+        self.top_n = meta["top_n"]
+        self.index = {tuple(key): i for i, key in enumerate(meta["keys"])}
+
+        self.rows = np.load(os.path.join(path, "rows.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(path, "scores.npy"), mmap_mode="r")
+
+    def lookup(self, key, top_n):
+
+        # A shorter list is always a prefix of the stored top-N, since the
+        # same-brand picks come first and the rest follow in score order.
+        if top_n > self.top_n:
+            return None
+
+        i = self.index.get(key)
+
+        if i is None:
+            return None
+
+        rows = np.asarray(self.rows[i, :top_n])
+        keep = rows >= 0
+
+        return rows[keep], np.asarray(self.scores[i, :top_n])[keep]
+
+
+def load_precomputed(version, path=PRECOMPUTED_DIR):
+
+    if not os.path.exists(os.path.join(path, "keys.json")):
+        return None
+
+    try:
+        precomputed = PrecomputedRecommendations(path)
+    except (OSError, ValueError):
+        # Caught between the two renames in publish().
+        return None
+
+    # A load that straddles a rebuild can pair keys from one build with
+    # rows from the next; the shapes give that away.
+    if precomputed.rows.shape != (len(precomputed.index), precomputed.top_n):
+        logger.warning("Ignoring precomputed recommendations replaced while loading")
+        return None
+
+    if precomputed.version != version:
+        logger.warning("Ignoring precomputed recommendations for another catalog version")
+        return None
+
+    return precomputed
+
+
+class PrecomputedStore:
+
+    # The build a worker serves, swapped for a newer one when precompute.py
+    # publishes again; ALSStore (als.py) does the same for the ALS factors.
+    def __init__(self, path=PRECOMPUTED_DIR, reload_interval=PRECOMPUTED_RELOAD_INTERVAL):
+
+        self.path = path
+        self.reload_interval = reload_interval
+
+        self.current = None
+        self.stamp = None
+        self.last_check = None
+
+        self.lock = threading.Lock()
+
+    def published(self):
+
+        try:
+            stat = os.stat(os.path.join(self.path, "keys.json"))
+        except OSError:
+            return None
+
+        return stat.st_ino, stat.st_mtime_ns
+
+    def reload(self, version):
+
+        now = time.monotonic()
+
+        if self.last_check is not None and now - self.last_check < self.reload_interval:
+            return
+
+        if not self.lock.acquire(blocking=False):
+            return
+
+        try:
+
+            self.last_check = now
+
+            stamp = self.published()
+
+            if stamp is None or stamp == self.stamp:
+                return
+
+            precomputed = load_precomputed(version, self.path)
+
+            # A build for another catalog version, or one caught mid-publish:
+            # keep serving the current one and look again next time.
+            if precomputed is not None:
+                self.current = precomputed
+                self.stamp = stamp
+
+        finally:
+            self.lock.release()
+
+    def get(self, version):
+
+        self.reload(version)
+
+        current = self.current
+
+        if current is None or current.version != version:
+            return None
+
+        return current
+
+
+def publish(tmp, path):
+
+    # Two renames: the old directory moves aside, the new one takes its
+    # place. A worker loading in between finds nothing and ranks live.
+    old = tmp + ".old"
+
+    if os.path.exists(path):
+        os.replace(path, old)
+
+    os.replace(tmp, path)
+
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def preference_grid():
+
+    fields = list(PREFERENCE_GRID)
+
+    for values in itertools.product(*PREFERENCE_GRID.values()):
+        yield dict(zip(fields, values))
+
+
+def rank_chunk(args):
+
+    prefs_list, top_n = args
+
+    from recommender import get_engine
+
+    ranked = get_engine().rank_batch(prefs_list, top_n)
+
+    return [(rows.tolist(), scores.tolist()) for rows, scores in ranked]
+
+
+def build(path=PRECOMPUTED_DIR, top_n=PRECOMPUTE_TOP_N, workers=None, chunk_size=256):
+
+    from recommender import get_engine
+
+    engine = get_engine()
+
+    unique = {}
+
+    for prefs in preference_grid():
+        unique.setdefault(engine.preference_key(prefs), prefs)
+
+    keys = list(unique)
+    prefs_list = list(unique.values())
+
+    chunks = [
+        (prefs_list[i:i + chunk_size], top_n)
+        for i in range(0, len(prefs_list), chunk_size)
+    ]
+
+    rows = np.full((len(keys), top_n), -1, dtype=np.int32)
+    scores = np.zeros((len(keys), top_n), dtype=np.float64)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        i = 0
+
+        for ranked in pool.map(rank_chunk, chunks):
+            for r, s in ranked:
+                rows[i, :len(r)] = r
+                scores[i, :len(s)] = s
+                i += 1
+
+    # Workers keep rows.npy and scores.npy memory-mapped, so a rebuild
+    # never writes into the published directory. It fills a fresh one and
+    # swaps it in; mappings of the old files stay valid after the unlink.
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+
+    tmp = tempfile.mkdtemp(dir=parent)
+
+    try:
+
+        np.save(os.path.join(tmp, "rows.npy"), rows)
+        np.save(os.path.join(tmp, "scores.npy"), scores)
+
+        with open(os.path.join(tmp, "keys.json"), "w") as f:
+            json.dump({
+                "version": engine.version,
+                "top_n": top_n,
+                "keys": [list(key) for key in keys]
+            }, f)
+
+        publish(tmp, path)
+
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return len(keys)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Precompute CBF results for the preference grid")
+    parser.add_argument("--path", default=PRECOMPUTED_DIR)
+    parser.add_argument("--top-n", type=int, default=PRECOMPUTE_TOP_N)
+    parser.add_argument("--workers", type=int, default=None)
+
+    args = parser.parse_args()
+
+    count = build(args.path, args.top_n, args.workers)
+
+    print(f"{count} preference combinations precomputed")
+    sys.exit(0)
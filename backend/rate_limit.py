@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+# Login attempts per minute and burst size, per email and per client IP.
+LOGIN_EMAIL_RATE = float(os.getenv("LOGIN_EMAIL_RATE", 5))
+LOGIN_EMAIL_BURST = float(os.getenv("LOGIN_EMAIL_BURST", 5))
+LOGIN_IP_RATE = float(os.getenv("LOGIN_IP_RATE", 30))
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", 20))
+
+# The per-IP bucket is off unless asked for. Logins normally arrive from
+# the Streamlit server, which forwards no client address, so one bucket
+# would throttle the whole site; the per-email bucket still applies.
+# Turn it on only where the backend sees real client addresses (direct
+# clients, or TRUST_FORWARDED_FOR behind a proxy that sets the header).
+LOGIN_IP_LIMIT = os.getenv("LOGIN_IP_LIMIT", "0") == "1"
+
+# Only trust X-Forwarded-For behind a proxy that sets it (e.g. Render);
+# otherwise clients could pick their own bucket.
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") == "1"
+
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+
+class RateLimiter:
+
+    # One token bucket per key: rate tokens per minute, up to burst. Idle
+    # keys are evicted oldest first once max_keys is reached; an evicted
+    # key starts again with a full bucket.
+    def __init__(self, rate, burst, max_keys=MAX_BUCKETS):
+
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, key, cost=1.0):
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            tokens, last = self.buckets.pop(key, (self.burst, now))
+
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+            allowed = tokens >= cost
+
+            if allowed:
+                tokens -= cost
+
+            self.buckets[key] = (tokens, now)
+
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+
+        return allowed
+
+    def retry_after(self, key, cost=1.0):
+
+        now = time.monotonic()
+
+        with self.lock:
+            tokens, last = self.buckets.get(key, (self.burst, now))
+
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens >= cost:
+            return 0.0
+
+        return (cost - tokens) / self.rate if self.rate else None
+
+
+email_limiter = RateLimiter(LOGIN_EMAIL_RATE, LOGIN_EMAIL_BURST)
+ip_limiter = RateLimiter(LOGIN_IP_RATE, LOGIN_IP_BURST)
+
+
+def client_address(remote_addr, forwarded_for=None):
+
+    if TRUST_FORWARDED_FOR and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+
+    return remote_addr
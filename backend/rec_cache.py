@@ -0,0 +1,76 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, maxsize=1024, ttl=None):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+
+        with self.lock:
+
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            value, expires = entry
+
+            if expires is not None and time.monotonic() >= expires:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return True, value
+
+    def put(self, key, value):
+
+        expires = None
+
+        if self.ttl:
+            expires = time.monotonic() + self.ttl
+
+        with self.lock:
+
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
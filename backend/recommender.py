@@ -1,63 +1,42 @@
-import pandas as pd
+import os
+import threading
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from rec_cache import LRUCache
+from diversity import pin_then_distinct, pin_then_distinct_batch
+from precompute import PrecomputedStore
+from model_artifacts import OUTPUT_COLUMNS, ensure_artifacts, load_artifacts
 
-df = pd.read_csv("../backend/dataset/car_rental_cbf.csv")
 
-df.fillna("", inplace=True)
+MILEAGE_CATEGORIES = ["Low", "Medium", "High"]
+CC_CATEGORIES = ["Low Power", "Medium Power", "High Power"]
 
-df["Mileage"] = pd.to_numeric(df["Mileage"], errors="coerce").fillna(0)
-df["Engine_CC"] = pd.to_numeric(df["Engine_CC"], errors="coerce").fillna(0)
-df["Year"] = pd.to_numeric(df["Year"], errors="coerce").fillna(0)
+SAME_BRAND_LIMIT = 2
 
-for col in ["Brand", "Fuel_Type", "Body_Type"]:
-    df[col] = df[col].astype(str).str.lower()
+BATCH_CHUNK = 256
 
-df["combined_text"] = (
-    df["Brand"] + " " +
-    df["Fuel_Type"] + " " +
-    df["Body_Type"]
-)
+CBF_CACHE_SIZE = int(os.getenv("CBF_CACHE_SIZE", 4096))
+CBF_CACHE_TTL = float(os.getenv("CBF_CACHE_TTL", 0)) or None
 
-tfidf = TfidfVectorizer(stop_words="english")
-tfidf_matrix = tfidf.fit_transform(df["combined_text"])
 
-def mileage_filter(dataframe, category):
+def mileage_filter(bands, category):
 
-    if category == "Low":
-        return dataframe[dataframe["Mileage"] < 15]
+    # Bands are precomputed per row (see model_artifacts.py), so a filter
+    # is one integer comparison.
+    if category in MILEAGE_CATEGORIES:
+        return bands == MILEAGE_CATEGORIES.index(category)
 
-    if category == "Medium":
-        return dataframe[
-            (dataframe["Mileage"] >= 15) &
-            (dataframe["Mileage"] < 22)
-        ]
-
-    if category == "High":
-        return dataframe[dataframe["Mileage"] >= 22]
-
-    return dataframe
+    return None
 
 
-def cc_filter(dataframe, category):
-
-    if category == "Low Power":
-        return dataframe[dataframe["Engine_CC"] < 1200]
-
-    if category == "Medium Power":
-        return dataframe[
-            (dataframe["Engine_CC"] >= 1200) &
-            (dataframe["Engine_CC"] < 2000)
-        ]
+def cc_filter(bands, category):
 
-    if category == "High Power":
-        return dataframe[dataframe["Engine_CC"] >= 2000]
+    if category in CC_CATEGORIES:
+        return bands == CC_CATEGORIES.index(category)
 
-    return dataframe
+    return None
 
 
-def recommend_cbf(prefs, top_n=5):
+def query_text(prefs):
 
     user_brand = prefs.get("Brand", "").lower()
 
@@ -70,77 +49,293 @@ def recommend_cbf(prefs, top_n=5):
     if not user_text.strip():
         user_text = "car"
 
-    user_vector = tfidf.transform([user_text])
-    similarity_scores = cosine_similarity(user_vector, tfidf_matrix)[0]
+    return user_brand, user_text
+
+
+class CBFEngine:
+
+    def __init__(self, vectorizer, matrix_t, features, version):
+
+        self.vectorizer = vectorizer
+        self.matrix_t = matrix_t
+        self.version = version
+
+        mileage = features["mileage_band"]
+        engine_cc = features["cc_band"]
+
+        self.numeric_score = features["numeric_score"]
+
+        self.catalog = features["catalog"]
+
+        self.brand_codes = self.catalog.codes["Brand"]
+        self.model_codes = self.catalog.codes["Model"]
+        self.n_models = len(self.catalog.dictionaries["Model"])
+
+        self.pair_codes = pair_codes = features["pair_codes"]
+
+        self.model_lookup = {
+            model.lower(): i
+            for i, model in enumerate(self.catalog.dictionaries["Model"])
+        }
+
+        # One row per (Brand, Model) for every filter combination, picked
+        # the same way drop_duplicates would after filtering.
+        self.candidates = {}
+
+        for m in MILEAGE_CATEGORIES + [None]:
+            for c in CC_CATEGORIES + [None]:
+
+                mask = np.ones(len(mileage), dtype=bool)
+
+                m_mask = mileage_filter(mileage, m)
+                c_mask = cc_filter(engine_cc, c)
+
+                if m_mask is not None:
+                    mask &= m_mask
+
+                if c_mask is not None:
+                    mask &= c_mask
+
+                if not mask.any():
+                    mask[:] = True
+
+                rows = np.flatnonzero(mask)
+                _, first = np.unique(pair_codes[rows], return_index=True)
+
+                self.candidates[(m, c)] = np.sort(rows[first])
+
+        # First catalog row of every (Brand, Model) pair, for candidates
+        # that come from outside the preference filters.
+        self.pair_rows = {
+            code: row
+            for code, row in zip(
+                pair_codes[self.candidates[(None, None)]].tolist(),
+                self.candidates[(None, None)].tolist()
+            )
+        }
+
+    def candidate_key(self, prefs):
+
+        mileage = prefs.get("Mileage")
+        engine_cc = prefs.get("Engine_CC")
+
+        if mileage not in MILEAGE_CATEGORIES:
+            mileage = None
+
+        if engine_cc not in CC_CATEGORIES:
+            engine_cc = None
+
+        return mileage, engine_cc
+
+    def preference_key(self, prefs):
+
+        # Everything recommend() reads from prefs, in the form it reads it,
+        # so equivalent preference dicts map to the same key.
+        user_brand, user_text = query_text(prefs)
+        mileage, engine_cc = self.candidate_key(prefs)
+
+        return user_brand, user_text, mileage, engine_cc
+
+    def cache_key(self, prefs, top_n):
+
+        return (self.version,) + self.preference_key(prefs) + (top_n,)
+
+    def candidate_rows(self, prefs):
+
+        return self.candidates[self.candidate_key(prefs)]
+
+    def pair_code(self, brand, model):
+
+        brand_code = self.catalog.code("Brand", str(brand).lower())
+        model_code = self.model_lookup.get(str(model).lower(), -1)
+
+        if brand_code < 0 or model_code < 0:
+            return -1
+
+        return brand_code * self.n_models + model_code
+
+    def similarity(self, user_text):
+
+        user_vector = self.vectorizer.transform([user_text])
+
+        return (user_vector @ self.matrix_t).toarray()[0]
+
+    def diversify(self, rows, scores, user_brand, top_n):
+
+        brand_code = self.catalog.code("Brand", user_brand)
 
-    df_copy = df.copy()
-    df_copy["similarity_score"] = similarity_scores
+        return pin_then_distinct(
+            scores,
+            self.brand_codes[rows] == brand_code,
+            SAME_BRAND_LIMIT,
+            self.model_codes[rows],
+            top_n
+        )
 
-    df_copy["numeric_score"] = (
-        (df_copy["Mileage"] / df_copy["Mileage"].max()) * 0.3 +
-        (df_copy["Engine_CC"] / df_copy["Engine_CC"].max()) * 0.2
-    )
+    def diversify_batch(self, rows, scores, user_brands, top_n):
 
-    df_copy["final_score"] = (
-        df_copy["similarity_score"] * 0.7 +
-        df_copy["numeric_score"] * 0.3
-    )
+        brand_codes = np.array([
+            self.catalog.code("Brand", brand) for brand in user_brands
+        ])
 
-    df_filtered = mileage_filter(df_copy, prefs.get("Mileage"))
-    df_filtered = cc_filter(df_filtered, prefs.get("Engine_CC"))
+        return pin_then_distinct_batch(
+            scores,
+            self.brand_codes[rows][None, :] == brand_codes[:, None],
+            SAME_BRAND_LIMIT,
+            self.model_codes[rows],
+            self.n_models,
+            top_n
+        )
 
-    if df_filtered.empty:
-        df_filtered = df_copy
+    def records(self, rows, scores):
 
-    df_filtered = df_filtered.drop_duplicates(
-        subset=["Brand", "Model"]
-    )
+        values = {
+            col: self.catalog.values(col, rows) for col in OUTPUT_COLUMNS
+        }
+
+        results = []
+
+        for i, score in enumerate(scores.tolist()):
+
+            record = {col: values[col][i] for col in OUTPUT_COLUMNS}
+            record["final_score"] = score
+
+            results.append(record)
+
+        return results
+
+    def recommend(self, prefs, top_n=5):
+
+        user_brand, user_text = query_text(prefs)
+
+        similarity = self.similarity(user_text)
+
+        rows = self.candidate_rows(prefs)
+
+        scores = (
+            similarity[rows] * 0.7 +
+            self.numeric_score[rows] * 0.3
+        )
+
+        positions = self.diversify(rows, scores, user_brand, top_n)
+
+        return self.records(rows[positions], scores[positions])
+
+    def recommend_batch(self, prefs_list, top_n=5):
+
+        return [
+            self.records(rows, scores)
+            for rows, scores in self.rank_batch(prefs_list, top_n)
+        ]
+
+    def rank_batch(self, prefs_list, top_n=5):
+
+        if not prefs_list:
+            return []
+
+        queries = [query_text(prefs) for prefs in prefs_list]
+        vectors = self.vectorizer.transform([text for _, text in queries])
+
+        results = [None] * len(prefs_list)
+
+        for start in range(0, len(prefs_list), BATCH_CHUNK):
+
+            stop = min(start + BATCH_CHUNK, len(prefs_list))
+            similarity = (vectors[start:stop] @ self.matrix_t).tocsr()
+
+            groups = {}
+
+            for i in range(start, stop):
+                key = self.candidate_key(prefs_list[i])
+                groups.setdefault(key, []).append(i)
+
+            for key, members in groups.items():
+
+                rows = self.candidates[key]
+                members = np.asarray(members)
+
+                sim = similarity[members - start][:, rows].toarray()
+
+                scores = (
+                    sim * 0.7 +
+                    self.numeric_score[rows] * 0.3
+                )
+
+                positions = self.diversify_batch(
+                    rows,
+                    scores,
+                    [queries[i][0] for i in members],
+                    top_n
+                )
+
+                for j, i in enumerate(members):
+                    pos = positions[j]
+                    results[i] = (rows[pos], scores[j, pos])
+
+        return results
+
+
+engine = None
+
+precomputed = PrecomputedStore()
+
+engine_lock = threading.Lock()
+
+cbf_cache = LRUCache(CBF_CACHE_SIZE, CBF_CACHE_TTL)
+
+
+def get_engine():
+
+    # Loaded on first use so importing the app stays cheap; the artifact
+    # is built once per dataset version (see model_artifacts.py).
+    global engine
+
+    if engine is None:
+
+        with engine_lock:
+
+            if engine is None:
+
+                model = load_artifacts(ensure_artifacts())
+
+                engine = CBFEngine(
+                    model["vectorizer"],
+                    model["matrix_t"],
+                    model["features"],
+                    model["version"]
+                )
+
+    return engine
+
+
+def recommend_cbf(prefs, top_n=5):
 
-    sorted_df = df_filtered.sort_values(
-        by="final_score",
-        ascending=False
-    )
+    engine = get_engine()
 
-    same_brand = sorted_df[
-        sorted_df["Brand"] == user_brand
-    ].head(2)
+    key = engine.cache_key(prefs, top_n)
 
-    other_brands = sorted_df[
-        sorted_df["Brand"] != user_brand
-    ]
+    hit, results = cbf_cache.get(key)
 
-    unique_rows = []
-    seen_models = set(same_brand["Model"].tolist())
+    if not hit:
 
-    for _, row in other_brands.iterrows():
+        results = None
 
-        model = row["Model"]
+        # Rebuilt offline by precompute.py; picked up once published.
+        build = precomputed.get(engine.version)
 
-        if model not in seen_models:
-            unique_rows.append(row)
-            seen_models.add(model)
+        if build is not None:
+            ranked = build.lookup(engine.preference_key(prefs), top_n)
+            if ranked is not None:
+                results = engine.records(*ranked)
 
-        if len(unique_rows) == (top_n - len(same_brand)):
-            break
+        if results is None:
+            results = engine.recommend(prefs, top_n)
 
-    other_df = pd.DataFrame(unique_rows)
+        cbf_cache.put(key, results)
 
-    final_df = pd.concat([same_brand, other_df])
+    return [dict(r) for r in results]
 
-    final_df = final_df.drop_duplicates(
-        subset=["Brand", "Model"]
-    )
 
-    final_df = final_df.head(top_n)
+def recommend_cbf_batch(prefs_list, top_n=5):
 
-    return final_df[[
-        "Car_ID",
-        "Brand",
-        "Model",
-        "Year",
-        "Fuel_Type",
-        "Body_Type",
-        "Mileage",
-        "Engine_CC",
-        "final_score"
-    ]].to_dict(orient="records")
\ No newline at end of file
+    return get_engine().recommend_batch(prefs_list, top_n)
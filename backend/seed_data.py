@@ -1,41 +1,122 @@
-from db import cars_col
+import os
+import argparse
+from datetime import datetime
+from pymongo import UpdateOne
+from db import cars_col, meta_col
+from catalog_cache import bump_catalog_version
+from model_artifacts import dataset_fingerprint
 import pandas as pd
 
 
-def seed_cars():
+DATASET_PATH = "./dataset/car_rental_cleaned.csv"
 
-    df = pd.read_csv("./dataset/car_rental_cleaned.csv")
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", 1000))
+
+SEED_FINGERPRINT_ID = "cars_seed"
+
+CAR_DEFAULTS = {
+    "Transmission": "",
+    "Seating_Capacity": 5,
+    "price": 1500,
+    "image": ""
+}
+
+CAR_FIELDS = [
+    "Brand",
+    "Model",
+    "Body_Type",
+    "Fuel_Type",
+    "Mileage",
+    "Engine_CC",
+    "Transmission",
+    "Seating_Capacity",
+    "price",
+    "image"
+]
+
+
+def car_documents(df):
+
+    df = df.drop_duplicates(subset=["Brand", "Model"])
+
+    fields = [col for col in CAR_FIELDS if col in df]
+
+    return df[fields].to_dict(orient="records")
+
+
+def car_defaults(df):
+
+    # Only fields the CSV lacks; a column that is present always wins.
+    return {col: default for col, default in CAR_DEFAULTS.items() if col not in df}
 
-    inserted = 0
 
-    for _, row in df.iterrows():
+def seed_cars(
+    path=DATASET_PATH,
+    batch_size=SEED_BATCH_SIZE,
+    force=False,
+    cars_collection=cars_col,
+    meta_collection=meta_col
+):
 
-        car = {
-            "Brand": row["Brand"],
-            "Model": row["Model"],
-            "Body_Type": row["Body_Type"],
-            "Fuel_Type": row["Fuel_Type"],
-            "Mileage": row["Mileage"],
-            "Engine_CC": row["Engine_CC"],
-            "Transmission": row.get("Transmission", ""),
-            "Seating_Capacity": row.get("Seating_Capacity", 5),
-            "price": row.get("price", 1500),
-            "image": row.get("image", "")
-        }
+    fingerprint = dataset_fingerprint(path)
 
-        exists = cars_col.find_one({
-            "Brand": car["Brand"],
-            "Model": car["Model"]
-        })
+    seeded = meta_collection.find_one({"_id": SEED_FINGERPRINT_ID})
 
-        if not exists:
-            cars_col.insert_one(car)
-            inserted += 1
+    if not force and seeded and seeded.get("fingerprint") == fingerprint:
+        print("Dataset unchanged, nothing to seed")
+        return 0
 
-    print(f"{inserted} cars inserted")
+    df = pd.read_csv(path)
 
-    return inserted
+    cars = car_documents(df)
+    defaults = car_defaults(df)
+
+    # The CSV is the source of truth for its own columns, so edits reach
+    # existing cars; defaults only fill in cars being created, leaving
+    # values set elsewhere (e.g. a price changed by an admin) alone.
+    ops = [
+        UpdateOne(
+            {"Brand": car["Brand"], "Model": car["Model"]},
+            {"$set": car, "$setOnInsert": defaults} if defaults else {"$set": car},
+            upsert=True
+        )
+        for car in cars
+    ]
+
+    inserted = 0
+    modified = 0
+
+    for start in range(0, len(ops), batch_size):
+        result = cars_collection.bulk_write(ops[start:start + batch_size], ordered=False)
+        inserted += result.upserted_count
+        modified += result.modified_count
+
+    meta_collection.update_one(
+        {"_id": SEED_FINGERPRINT_ID},
+        {"$set": {
+            "fingerprint": fingerprint,
+            "rows": len(cars),
+            "seeded_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
+    # Matched rows whose values were already current do not count.
+    if inserted or modified:
+        bump_catalog_version(meta_collection)
+
+    print(f"{inserted} cars inserted, {modified} updated")
+
+    return inserted + modified
 
 
 if __name__ == "__main__":
-    seed_cars()
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Seed the cars collection")
+    parser.add_argument("--path", default=DATASET_PATH)
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true")
+
+    args = parser.parse_args()
+
+    seed_cars(args.path, args.batch_size, args.force)
@@ -0,0 +1,382 @@
+import os
+from bson import ObjectId
+from datetime import datetime
+
+from auth import login_user, register_user
+from password_pool import PasswordPoolBusy
+from rate_limit import LOGIN_IP_LIMIT, email_limiter, ip_limiter
+from tokens import InvalidSession, issue_token, verify_token
+from catalog_cache import catalog
+from cars import get_cars_by_ids, page_etag, render_page
+from interactions import ALLOWED_ACTIONS, store_interaction
+from recommender import recommend_cbf, recommend_cbf_batch
+from cf_recommender import recommend_cf, similar_cars
+from item_neighbours import ITEM_NEIGHBOURS
+from hybrid import recommend_hybrid, resolve_weights
+from user_stats import get_user_stats
+
+
+# Route logic shared by the Flask app (app.py) and the ASGI app (asgi.py).
+# Everything here is blocking; each function takes the parsed request (and
+# the bearer token, if any) and returns (body, status).
+
+
+# Upper bounds on what one request can ask the recommender for.
+BATCH_MAX_PREFERENCES = int(os.getenv("RECOMMEND_BATCH_MAX", 50))
+MAX_TOP_N = int(os.getenv("RECOMMEND_MAX_TOP_N", 20))
+
+
+def session_user(data, token=None):
+
+    # Every user-scoped route needs a signed session token. A user_id in
+    # the body is ignored: anyone could send someone else's.
+    token = token or (data or {}).get("token")
+
+    if not token:
+        raise InvalidSession("Sign-in required")
+
+    claims = verify_token(token)
+
+    if claims is None:
+        raise InvalidSession("Invalid or expired session")
+
+    return claims["uid"], claims
+
+
+def is_existing_user(user_id, claims=None):
+
+    # Eligibility only ever turns on, so a token that says so is enough.
+    if claims and claims.get("cf"):
+        return True
+
+    stats = get_user_stats(ObjectId(user_id))
+
+    return stats.get("total", 0) >= 3
+
+
+def parse_top_n(value):
+
+    try:
+        top_n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("top_n must be an integer")
+
+    if not 1 <= top_n <= MAX_TOP_N:
+        raise ValueError(f"top_n must be between 1 and {MAX_TOP_N}")
+
+    return top_n
+
+
+def unauthorized():
+
+    return {"error": "Invalid or expired session"}, 401
+
+
+def throttled(limiter, key):
+
+    retry_after = limiter.retry_after(key)
+
+    return {
+        "error": "Too many attempts, try again later",
+        "retry_after": round(retry_after, 1) if retry_after is not None else None
+    }, 429
+
+
+def busy():
+
+    return {"error": "Server busy, try again shortly"}, 503
+
+
+def login(data, client_ip=None):
+
+    email = str(data.get("email") or "").strip().lower()
+
+    # Shed abusive traffic before it costs a bcrypt check.
+    if LOGIN_IP_LIMIT and client_ip and not ip_limiter.allow(client_ip):
+        return throttled(ip_limiter, client_ip)
+
+    if email and not email_limiter.allow(email):
+        return throttled(email_limiter, email)
+
+    try:
+        user = login_user(data.get("email"), data.get("password"))
+    except PasswordPoolBusy:
+        return busy()
+
+    if not user:
+        return {"error": "Invalid credentials"}, 401
+
+    user_id = str(user["_id"])
+
+    # The frontend only needs the id; the token carries it from here on,
+    # along with the CF gate so later requests can skip that lookup.
+    return {
+        "user": {
+            "_id": user_id,
+            "name": user.get("name"),
+            "email": user.get("email")
+        },
+        "token": issue_token(user_id, cf=is_existing_user(user_id))
+    }, 200
+
+
+def signup(data, client_ip=None):
+
+    if LOGIN_IP_LIMIT and client_ip and not ip_limiter.allow(client_ip):
+        return throttled(ip_limiter, client_ip)
+
+    try:
+        ok = register_user(
+            data.get("name"),
+            data.get("email"),
+            data.get("phone"),
+            data.get("password")
+        )
+    except PasswordPoolBusy:
+        return busy()
+
+    return {"success": ok}, 200
+
+
+def cars_page_etag(args):
+
+    # Pages come from the catalog snapshot, never Mongo. The ETag is known
+    # up front, so a matching If-None-Match costs no filtering at all.
+    snapshot = catalog.get()
+
+    return snapshot, page_etag(snapshot, args)
+
+
+def cars_page(snapshot, args, etag):
+
+    # The body is the serialised page; the caller sends it as is.
+    try:
+        return render_page(snapshot, args, etag), 200
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+
+def parse_limit(value):
+
+    # similar_cars reads precomputed neighbour lists, which hold at most
+    # ITEM_NEIGHBOURS cars each.
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+
+    if not 1 <= limit <= ITEM_NEIGHBOURS:
+        raise ValueError(f"limit must be between 1 and {ITEM_NEIGHBOURS}")
+
+    return limit
+
+
+def similar(car_id, limit=5):
+
+    try:
+        limit = parse_limit(limit)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {"cars": similar_cars(car_id, top_n=limit)}, 200
+
+
+def content_recommendations(prefs):
+
+    return recommend_cbf(prefs, top_n=3)
+
+
+def collaborative_recommendations(user_id, claims=None):
+
+    # Returns (cars, token): a fresh token when a token holder has just
+    # become eligible, so the next request skips the gate.
+    if not user_id or not is_existing_user(user_id, claims):
+        return [], None
+
+    token = None
+
+    if claims is not None and not claims.get("cf"):
+        token = issue_token(user_id, cf=True)
+
+    return recommend_cf(ObjectId(user_id), top_n=2), token
+
+
+def recommend_response(cbf_cars, cf_cars, token=None):
+
+    body = {
+        "cbf": cbf_cars,
+        "cf": cf_cars
+    }
+
+    if token:
+        body["token"] = token
+
+    return body, 200
+
+
+def recommend(data, token=None):
+
+    try:
+        user_id, claims = session_user(data, token)
+    except InvalidSession:
+        return unauthorized()
+
+    cf_cars, token = collaborative_recommendations(user_id, claims)
+
+    return recommend_response(
+        content_recommendations(data.get("preferences")),
+        cf_cars,
+        token
+    )
+
+
+def recommend_batch(data, token=None):
+
+    data = data or {}
+
+    try:
+        session_user(data, token)
+    except InvalidSession:
+        return unauthorized()
+
+    prefs_list = data.get("preferences")
+
+    if not isinstance(prefs_list, list):
+        return {"error": "preferences must be a list"}, 400
+
+    if len(prefs_list) > BATCH_MAX_PREFERENCES:
+        return {"error": f"At most {BATCH_MAX_PREFERENCES} preferences per batch"}, 400
+
+    if not all(isinstance(prefs, dict) for prefs in prefs_list):
+        return {"error": "Each preferences entry must be an object"}, 400
+
+    try:
+        top_n = parse_top_n(data.get("top_n", 3))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    results = recommend_cbf_batch(prefs_list, top_n=top_n)
+
+    return {"results": results}, 200
+
+
+def recommend_blended(data, token=None):
+
+    try:
+        user_id, claims = session_user(data, token)
+    except InvalidSession:
+        return unauthorized()
+
+    prefs = data.get("preferences") or {}
+
+    try:
+        top_n = parse_top_n(data.get("top_n", 5))
+        weights = resolve_weights(data.get("weights"))
+    except (TypeError, ValueError, AttributeError) as e:
+        return {"error": str(e)}, 400
+
+    cf_user = None
+
+    if user_id and is_existing_user(user_id, claims):
+        cf_user = ObjectId(user_id)
+
+    results = recommend_hybrid(
+        prefs,
+        user_id=cf_user,
+        top_n=top_n,
+        weights=weights
+    )
+
+    return {
+        "results": results,
+        "weights": weights
+    }, 200
+
+
+def user_bookings(user_id, token=None):
+
+    try:
+        session_id, _ = session_user(None, token)
+    except InvalidSession:
+        return unauthorized()
+
+    if session_id != user_id:
+        return {"error": "Forbidden"}, 403
+
+    bookings = get_user_stats(ObjectId(user_id)).get("bookings", {})
+
+    results = list(bookings.items())
+
+    cars = get_cars_by_ids([car_id for car_id, _ in results])
+
+    output = []
+
+    for (_, count), car in zip(results, cars):
+
+        if car:
+
+            output.append({
+                "car": f"{car['Brand']} {car['Model']}",
+                "count": count
+            })
+
+    return output, 200
+
+
+def interact(data, token=None):
+
+    try:
+        user_id, _ = session_user(data, token)
+    except InvalidSession:
+        return unauthorized()
+
+    action = data.get("action")
+    car_id = data.get("car_id")
+
+    # The action becomes a field name in user_stats, so only known ones
+    # get through.
+    if action not in ALLOWED_ACTIONS:
+        return {"error": "Invalid action"}, 400
+
+    doc = {
+        "user_id": ObjectId(user_id),
+        "action": action,
+        "timestamp": datetime.utcnow()
+    }
+
+    if car_id:
+        try:
+            doc["car_id"] = ObjectId(car_id)
+        except Exception:
+            pass
+
+    store_interaction(doc)
+
+    return {"success": True}, 200
+
+
+def book(data, token=None):
+
+    try:
+        user_id, _ = session_user(data, token)
+    except InvalidSession:
+        return unauthorized()
+
+    try:
+
+        car_id = data.get("car_id")
+
+        store_interaction({
+            "user_id": ObjectId(user_id),
+            "car_id": ObjectId(car_id),
+            "action": "book",
+            "timestamp": datetime.utcnow()
+        })
+
+        return {"success": True}, 200
+
+    except Exception as e:
+
+        print("BOOK ERROR:", e)
+
+        return {"success": False}, 200
@@ -0,0 +1,11 @@
+import os
+import sys
+
+
+# Tests hand mongomock collections to the code under test. db.py still
+# builds a client at import, so point it at a local URI: pymongo connects
+# lazily, and nothing here ever reaches the configured database.
+os.environ["MONGO_URI"] = "mongodb://localhost:27017/?serverSelectionTimeoutMS=200"
+os.environ["SESSION_SECRET"] = "test-session-secret"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
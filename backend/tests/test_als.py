@@ -0,0 +1,120 @@
+import threading
+from datetime import datetime, timedelta
+
+import mongomock
+import numpy as np
+from bson import ObjectId
+
+import als
+from als import ALSStore, load_model, retrain, save_model, train
+from cf_recommender import CFModel
+
+
+def taste_groups(users=40, cars=20, seed=0):
+
+    # Two groups of users, each sticking to its own half of the cars.
+    rng = np.random.default_rng(seed)
+
+    user_ids = [ObjectId() for _ in range(users)]
+    car_ids = [ObjectId() for _ in range(cars)]
+
+    docs = []
+
+    for u, user in enumerate(user_ids):
+
+        half = car_ids[:cars // 2] if u % 2 else car_ids[cars // 2:]
+
+        for car in rng.choice(len(half), 4, replace=False):
+            docs.append({
+                "user_id": user,
+                "car_id": half[car],
+                "action": "view",
+                "timestamp": datetime.utcnow() - timedelta(minutes=5)
+            })
+
+    return user_ids, car_ids, docs
+
+
+def make_source(docs):
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+    collection.insert_many(docs)
+
+    return CFModel(collection), collection
+
+
+def test_workers_serve_the_published_factors(tmp_path):
+
+    users, cars, docs = taste_groups()
+    source, _ = make_source(docs)
+
+    trained = train(source)
+
+    path = str(tmp_path / "als")
+    save_model(trained, path)
+
+    store = ALSStore(path, reload_interval=0)
+
+    threads = threading.active_count()
+
+    served = store.recommend(users[1], 3)
+
+    assert served == trained.recommend(users[1], 3)
+    assert {car for car, _ in served} <= {str(car) for car in cars[:10]}
+    assert isinstance(store.current.user_factors, np.memmap)
+
+    # Serving never trains in the background.
+    assert threading.active_count() == threads
+
+
+def test_store_picks_up_a_newer_build(tmp_path):
+
+    users, _, docs = taste_groups()
+    source, collection = make_source(docs)
+
+    path = str(tmp_path / "als")
+    store = ALSStore(path, reload_interval=0)
+
+    assert store.recommend(users[0], 3) is None
+
+    save_model(train(source), path)
+
+    assert store.recommend(users[0], 3) is not None
+
+    newcomer = ObjectId()
+    collection.insert_many([dict(doc, _id=ObjectId(), user_id=newcomer) for doc in docs[:4]])
+
+    assert store.recommend(newcomer, 3) is None
+
+    save_model(train(source), path)
+
+    assert store.recommend(newcomer, 3) is not None
+
+
+def test_missing_factors_load_as_nothing(tmp_path):
+
+    assert load_model(str(tmp_path / "als")) is None
+
+
+def test_retrain_keeps_going_after_a_failed_run(monkeypatch):
+
+    stopping = threading.Event()
+    runs = []
+
+    def build(path):
+
+        runs.append(path)
+
+        if len(runs) == 1:
+            raise RuntimeError("Mongo unavailable")
+
+        if len(runs) == 3:
+            stopping.set()
+
+        return 1
+
+    monkeypatch.setattr(als, "build", build)
+
+    retrain("factors", interval=0, stopping=stopping)
+
+    assert runs == ["factors"] * 3
@@ -0,0 +1,117 @@
+import re
+
+import mongomock
+import pytest
+from bson import ObjectId
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import app
+import asgi
+from catalog_cache import catalog
+from tokens import issue_token
+
+
+TOKEN = issue_token(str(ObjectId()))
+
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+
+    # The shared catalog cache, on a mongomock catalog of two cars.
+    database = mongomock.MongoClient()["car_rental_db"]
+    database["cars"].insert_many([
+        {"_id": ObjectId(), "Brand": "Kia", "Model": "Rio", "Mileage": 18},
+        {"_id": ObjectId(), "Brand": "Tata", "Model": "Nexon", "Mileage": 17},
+    ])
+
+    monkeypatch.setattr(catalog, "cars_collection", database["cars"])
+    monkeypatch.setattr(catalog, "meta_collection", database["meta"])
+    monkeypatch.setattr(catalog, "snapshot", None)
+
+    return app.app.test_client(), TestClient(asgi.app)
+
+
+def flask_routes():
+
+    routes = set()
+
+    for rule in app.app.url_map.iter_rules():
+
+        if rule.endpoint == "static":
+            continue
+
+        path = re.sub(r"<(\w+)>", r"{\1}", rule.rule)
+        routes.add((path, frozenset(rule.methods - {"HEAD", "OPTIONS"})))
+
+    return routes
+
+
+def asgi_routes():
+
+    return {
+        (route.path, frozenset(route.methods - {"HEAD"}))
+        for route in asgi.routes
+        if isinstance(route, Route)
+    }
+
+
+def test_both_apps_serve_the_same_routes():
+
+    assert flask_routes() == asgi_routes()
+
+
+REQUESTS = [
+    ("post", "/api/book", {"car_id": str(ObjectId())}, {}),
+    ("post", "/api/interact", {"action": "view"}, {}),
+    ("post", "/api/interact", {"action": "bad.action"}, AUTH),
+    ("post", "/api/recommend", {"preferences": {}}, {"Authorization": "Bearer nope"}),
+    ("post", "/api/recommend/batch", {"preferences": {}}, AUTH),
+    ("post", "/api/recommend/batch", {"preferences": [{}], "top_n": 0}, AUTH),
+    ("post", "/api/recommend/hybrid", {"weights": {"cf": "nan"}}, AUTH),
+    ("get", f"/api/user-bookings/{ObjectId()}", None, {}),
+    ("get", f"/api/user-bookings/{ObjectId()}", None, AUTH),
+    ("get", f"/api/cars/{ObjectId()}/similar?limit=0", None, {}),
+    ("get", "/api/cars?limit=1&fields=Model", None, {}),
+    ("get", "/api/cars?after=nope", None, {}),
+    ("get", "/api/cars?max_cc=big", None, {}),
+    ("get", "/api/interactions/export", None, {}),
+    ("get", "/api/metrics/interactions", None, {}),
+    ("get", "/api/metrics/cache", None, {}),
+]
+
+
+@pytest.mark.parametrize("method, path, body, headers", REQUESTS)
+def test_both_apps_answer_alike(clients, method, path, body, headers):
+
+    flask_client, asgi_client = clients
+
+    kwargs = {"headers": headers}
+
+    if body is not None:
+        kwargs["json"] = body
+
+    flask_response = getattr(flask_client, method)(path, **kwargs)
+    asgi_response = getattr(asgi_client, method)(path, **kwargs)
+
+    assert asgi_response.status_code == flask_response.status_code
+    assert asgi_response.json() == flask_response.get_json()
+
+
+@pytest.mark.parametrize("path", ["/api/cars", "/api/cars?Brand=Kia"])
+def test_both_apps_share_catalog_etags(clients, path):
+
+    flask_client, asgi_client = clients
+
+    flask_response = flask_client.get(path)
+    asgi_response = asgi_client.get(path)
+
+    assert asgi_response.content == flask_response.data
+    assert asgi_response.headers["ETag"] == flask_response.headers["ETag"]
+
+    etag = {"If-None-Match": flask_response.headers["ETag"]}
+
+    assert flask_client.get(path, headers=etag).status_code == 304
+    assert asgi_client.get(path, headers=etag).status_code == 304
@@ -0,0 +1,160 @@
+import mongomock
+import pytest
+from bson import ObjectId
+from starlette.testclient import TestClient
+
+import app
+import asgi
+import cars
+import services
+from catalog_cache import CatalogCache, bump_catalog_version
+from item_neighbours import ITEM_NEIGHBOURS
+
+
+def make_catalog(rows):
+
+    database = mongomock.MongoClient()["car_rental_db"]
+
+    # Inserted out of _id order; the snapshot sorts them.
+    database["cars"].insert_many(
+        [dict(row, _id=ObjectId()) for row in rows][::-1]
+    )
+
+    return CatalogCache(database["cars"], database["meta"]), database
+
+
+ROWS = [
+    {"Brand": "Kia", "Model": "Rio", "Fuel_Type": "Petrol", "Mileage": 18, "Engine_CC": 1200},
+    {"Brand": "Kia", "Model": "Seltos", "Fuel_Type": "Diesel", "Mileage": 16, "Engine_CC": 1500},
+    {"Brand": "Tata", "Model": "Nexon", "Fuel_Type": "Petrol", "Mileage": 17, "Engine_CC": 1200},
+    {"Brand": "Tata", "Model": "Harrier", "Fuel_Type": "Diesel", "Mileage": "unknown", "Engine_CC": 2000},
+]
+
+
+def test_filters_pages_and_projects_from_the_snapshot():
+
+    catalog, _ = make_catalog(ROWS)
+    snapshot = catalog.get()
+
+    assert list(snapshot.ids) == sorted(snapshot.ids)
+
+    page, after = cars.find_cars(snapshot, {"Brand": "Kia,Tata", "min_mileage": "17"}, ["Model"], limit=1)
+
+    assert [set(c) for c in page] == [{"_id", "Model"}]
+
+    models = [page[0]["Model"]]
+
+    while after:
+        page, after = cars.find_cars(snapshot, {"Brand": "Kia,Tata", "min_mileage": "17"}, ["Model"], limit=1, after=after)
+        models += [c["Model"] for c in page]
+
+    # "unknown" mileage never satisfies a numeric bound, as in Mongo.
+    assert sorted(models) == ["Nexon", "Rio"]
+
+
+def test_bad_cursor_and_bounds_are_rejected():
+
+    catalog, _ = make_catalog(ROWS)
+    snapshot = catalog.get()
+
+    with pytest.raises(ValueError):
+        cars.find_cars(snapshot, {}, after="nope")
+
+    with pytest.raises(ValueError):
+        cars.find_cars(snapshot, {"max_cc": "big"})
+
+
+def test_page_etag_follows_snapshot_and_query():
+
+    catalog, database = make_catalog(ROWS)
+    snapshot = catalog.get()
+
+    etag = cars.page_etag(snapshot, {"Brand": "Kia", "limit": "10"})
+
+    assert etag == cars.page_etag(snapshot, {"limit": "10", "Brand": "Kia", "unused": "x"})
+    assert etag != cars.page_etag(snapshot, {"Brand": "Tata", "limit": "10"})
+
+    database["cars"].insert_one({"_id": ObjectId(), "Brand": "Kia", "Model": "Sonet"})
+    bump_catalog_version(database["meta"])
+
+    catalog.last_poll = None
+
+    assert etag != cars.page_etag(catalog.get(), {"Brand": "Kia", "limit": "10"})
+
+
+def test_matching_etag_skips_rendering(monkeypatch):
+
+    catalog, _ = make_catalog(ROWS)
+
+    monkeypatch.setattr(services, "catalog", catalog)
+
+    client = app.app.test_client()
+
+    first = client.get("/api/cars?Brand=Kia&fields=Model")
+
+    assert first.status_code == 200
+    assert {c["Model"] for c in first.get_json()["cars"]} == {"Rio", "Seltos"}
+
+    def render(*args):
+        raise AssertionError("page rendered for a matching ETag")
+
+    monkeypatch.setattr(services, "render_page", render)
+
+    again = client.get(
+        "/api/cars?Brand=Kia&fields=Model",
+        headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert again.status_code == 304
+
+
+def test_invalidate_reloads_without_waiting_for_a_poll():
+
+    catalog, database = make_catalog(ROWS)
+    snapshot = catalog.get()
+
+    database["cars"].insert_one({"_id": ObjectId(), "Brand": "Kia", "Model": "Sonet"})
+
+    # No version bump and no poll due: the cached snapshot is still served.
+    assert catalog.get() is snapshot
+
+    catalog.invalidate()
+
+    assert len(catalog.get().cars) == len(ROWS) + 1
+
+
+def test_similar_limit_is_bounded(monkeypatch):
+
+    monkeypatch.setattr(services, "similar_cars", lambda car_id, top_n: [{"top_n": top_n}])
+
+    flask_client = app.app.test_client()
+    asgi_client = TestClient(asgi.app)
+
+    car_id = str(ObjectId())
+
+    for limit in ["0", "-1", str(ITEM_NEIGHBOURS + 1), "many"]:
+        assert flask_client.get(f"/api/cars/{car_id}/similar?limit={limit}").status_code == 400
+        assert asgi_client.get(f"/api/cars/{car_id}/similar?limit={limit}").status_code == 400
+
+    expected = {"cars": [{"top_n": ITEM_NEIGHBOURS}]}
+
+    assert flask_client.get(f"/api/cars/{car_id}/similar?limit={ITEM_NEIGHBOURS}").get_json() == expected
+    assert asgi_client.get(f"/api/cars/{car_id}/similar?limit={ITEM_NEIGHBOURS}").json() == expected
+
+
+def test_get_cars_by_ids_keeps_order_and_marks_missing(monkeypatch):
+
+    _, database = make_catalog(ROWS)
+    monkeypatch.setattr(cars, "cars_col", database["cars"])
+
+    rio, nexon = (str(database["cars"].find_one({"Model": m})["_id"]) for m in ["Rio", "Nexon"])
+
+    found = cars.get_cars_by_ids([nexon, "not-an-id", rio, str(ObjectId()), nexon])
+
+    assert [c["Model"] if c else None for c in found] == ["Nexon", None, "Rio", None, "Nexon"]
+
+    # Each entry is its own copy, and ids come back as strings.
+    assert found[0] is not found[4]
+    assert found[0]["_id"] == nexon
+
+    assert cars.get_cars_by_ids([]) == []
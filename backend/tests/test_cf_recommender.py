@@ -0,0 +1,335 @@
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+import numpy as np
+from bson import ObjectId
+from scipy import sparse
+
+from cf_recommender import SKEW_SECONDS, CFModel, ExactIndex, LSHIndex
+from item_neighbours import ItemNeighbours
+
+
+def interaction(user, car, minutes_ago=60, action="view"):
+
+    return {
+        "user_id": user,
+        "car_id": car,
+        "action": action,
+        "timestamp": datetime.utcnow() - timedelta(minutes=minutes_ago)
+    }
+
+
+def stamped(seconds_ago):
+
+    # An _id generated that long ago, as a worker that flushed then but
+    # whose insert only lands now would have stamped it.
+    stamp = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=seconds_ago))
+
+    return ObjectId(stamp.binary[:4] + ObjectId().binary[4:])
+
+
+def make_model(docs):
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+
+    if docs:
+        collection.insert_many(docs)
+
+    model = CFModel(collection)
+    model.refresh(force=True)
+
+    return model, collection
+
+
+def test_recommends_what_similar_users_touched():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared, extra = ObjectId(), ObjectId()
+
+    model, _ = make_model([
+        interaction(alice, shared),
+        interaction(bob, shared),
+        interaction(bob, extra),
+    ])
+
+    assert model.recommend(alice, 3) == [(str(extra), 1)]
+
+
+def test_reader_on_an_older_state_ignores_newer_neighbours():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared = ObjectId()
+
+    model, collection = make_model([
+        interaction(alice, shared),
+        interaction(bob, shared),
+    ])
+
+    older = model.state
+
+    # New users arrive; the shared index learns about them.
+    collection.insert_many([
+        interaction(ObjectId(), shared, minutes_ago=0) for _ in range(5)
+    ])
+    model.refresh(force=True)
+
+    assert model.state.matrix.shape[0] > older.matrix.shape[0]
+
+    # A request that read the state before the refresh must not index
+    # its matrix with positions only the new state has.
+    model.state = older
+
+    assert model.recommend(alice, 3) == []
+
+
+def test_refresh_already_running_does_not_block():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared, extra = ObjectId(), ObjectId()
+
+    model, collection = make_model([
+        interaction(alice, shared),
+        interaction(bob, shared),
+    ])
+
+    before = model.state
+
+    collection.insert_one(interaction(bob, extra, minutes_ago=0))
+
+    # Another thread is mid-refresh: this one returns straight away and
+    # requests keep serving the state already published.
+    model.lock.acquire()
+
+    try:
+        model.refresh(force=True)
+        assert model.state is before
+        assert model.recommend(alice, 3) == []
+    finally:
+        model.lock.release()
+
+    model.refresh(force=True)
+
+    assert model.recommend(alice, 3) == [(str(extra), 1)]
+
+
+def test_late_flush_is_counted_once():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared, extra = ObjectId(), ObjectId()
+
+    model, collection = make_model([
+        interaction(alice, shared),
+        interaction(bob, shared),
+    ])
+
+    late = interaction(bob, extra, minutes_ago=1)
+    late["_id"] = stamped(2)
+
+    collection.insert_one(late)
+
+    model.refresh(force=True)
+    model.refresh(force=True)
+
+    assert model.recommend(alice, 3) == [(str(extra), 1)]
+    assert model.state.matrix[
+        model.state.user_index[str(bob)],
+        model.state.car_index[str(extra)]
+    ] == 1
+
+
+class RecordingCollection:
+
+    def __init__(self, collection):
+
+        self.collection = collection
+        self.queries = []
+
+    def find(self, query, projection=None):
+
+        self.queries.append(query)
+
+        return self.collection.find(query, projection)
+
+
+def test_refresh_scans_only_past_the_newest_counted_id():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared = ObjectId()
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+    collection.insert_many([interaction(alice, shared), interaction(bob, shared)])
+
+    recording = RecordingCollection(collection)
+    model = CFModel(recording)
+
+    model.refresh(force=True)
+    newest = model.last_id
+
+    model.refresh(force=True)
+
+    # The first refresh loads everything; later ones only look back by
+    # the skew margin from the newest id, not a fixed window.
+    assert "_id" not in recording.queries[0]
+
+    since = recording.queries[1]["_id"]["$gt"].generation_time
+    assert newest.generation_time - since <= timedelta(seconds=SKEW_SECONDS)
+
+    assert model.state.matrix.sum() == 2
+
+
+def test_start_warms_the_model_in_the_background():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared, extra = ObjectId(), ObjectId()
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+    collection.insert_many([
+        interaction(alice, shared),
+        interaction(bob, shared),
+        interaction(bob, extra),
+    ])
+
+    model = CFModel(collection)
+    model.start()
+
+    try:
+        deadline = time.monotonic() + 5
+
+        while model.last_refresh is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert model.recommend(alice, 3) == [(str(extra), 1)]
+    finally:
+        model.stop()
+
+
+def clustered_matrix(groups=4, users=25, cars=12, seed=1):
+
+    # Each group of users draws most of its cars from its own block, so
+    # the exact neighbours of a user are (almost) its own group.
+    rng = np.random.default_rng(seed)
+
+    rows, cols = [], []
+
+    for group in range(groups):
+        for user in range(users):
+            picks = rng.choice(cars, size=6, replace=False) + group * cars
+            rows.extend([group * users + user] * len(picks))
+            cols.extend(picks.tolist())
+
+    return sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+        shape=(groups * users, groups * cars)
+    )
+
+
+def test_lsh_neighbours_agree_with_the_exact_index():
+
+    matrix = clustered_matrix()
+    overlap = (matrix @ matrix.T).toarray()
+
+    exact = ExactIndex()
+    exact.rebuild(matrix)
+
+    # Few bits for so few cars, or most buckets hold a single user.
+    lsh = LSHIndex(tables=16, bits=6)
+    lsh.rebuild(matrix)
+
+    k = 10
+    good = 0
+
+    for user in range(matrix.shape[0]):
+
+        expected = exact.query(user, k)
+        got = lsh.query(user, k)
+
+        assert user not in got
+        assert len(got) <= k
+
+        # Many users tie on overlap, so compare scores, not ids: a hit is
+        # a neighbour at least as close as the exact k-th one.
+        cutoff = overlap[user, expected[-1]]
+        good += sum(overlap[user, other] >= cutoff for other in got)
+
+    assert good / (matrix.shape[0] * k) >= 0.95
+
+
+def test_lsh_rebuild_matches_incremental_inserts():
+
+    matrix = clustered_matrix()
+
+    incremental = LSHIndex()
+
+    for start in range(0, matrix.shape[0], 30):
+        users = np.arange(start, min(start + 30, matrix.shape[0]))
+        incremental.insert(matrix[:users[-1] + 1], users)
+
+    rebuilt = LSHIndex()
+    rebuilt.rebuild(matrix)
+
+    for user in range(matrix.shape[0]):
+        assert incremental.query(user, 10) == rebuilt.query(user, 10)
+
+
+def test_item_neighbours_rebuild_matches_incremental_updates():
+
+    matrix = clustered_matrix().tolil()
+
+    incremental = ItemNeighbours(k=5)
+    incremental.update(matrix.tocsr()[:, :30], np.arange(30))
+
+    # Later interactions touch both old and new cars.
+    incremental.update(matrix.tocsr(), np.arange(20, matrix.shape[1]))
+
+    rebuilt = ItemNeighbours(k=5)
+    rebuilt.rebuild(matrix.tocsr())
+
+    assert np.array_equal(incremental.table[0], rebuilt.table[0])
+    assert np.allclose(incremental.table[1], rebuilt.table[1])
+
+
+def test_item_neighbours_follow_batches_of_new_interactions():
+
+    # Feed interactions in batches, as refresh() does, updating only the
+    # cars each batch touched, and compare with a full recompute.
+    rng = np.random.default_rng(7)
+
+    users, cars = 60, 30
+    matrix = sparse.csr_matrix((users, cars), dtype=np.int64)
+
+    incremental = ItemNeighbours(k=4)
+
+    for _ in range(8):
+
+        rows = rng.integers(0, users, 25)
+        cols = rng.integers(0, cars, 25)
+
+        matrix = (matrix + sparse.csr_matrix(
+            (np.ones(25, dtype=np.int64), (rows, cols)),
+            shape=(users, cars)
+        )).tocsr()
+
+        incremental.update(matrix, np.unique(cols))
+
+        full = ItemNeighbours(k=4)
+        full.rebuild(matrix)
+
+        assert np.array_equal(incremental.table[0], full.table[0])
+        assert np.allclose(incremental.table[1], full.table[1])
+
+
+def test_rebuild_index_keeps_recommendations():
+
+    alice, bob = ObjectId(), ObjectId()
+    shared, extra = ObjectId(), ObjectId()
+
+    model, _ = make_model([
+        interaction(alice, shared),
+        interaction(bob, shared),
+        interaction(bob, extra),
+    ])
+
+    model.rebuild_index()
+
+    assert model.recommend(alice, 3) == [(str(extra), 1)]
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import cleaning
+import model_artifacts
+from catalog_store import ColumnarCatalog
+
+
+RAW = """Car_ID,Brand,Model,Year,Fuel_Type,Transmission,Body_Type,Mileage,Engine_CC
+1,Kia,Rio,2019,Petrol,Manual,Hatchback,18,1200
+2, Kia ,Seltos,,Diesel,Automatic,SUV,16.5,1500
+,Tata,Ghost,2020,Petrol,Manual,SUV,17,1200
+3,Tata,Nexon,2021,,Manual,SUV,17,
+4,BMW,X1,2022,Diesel,Automatic,SUV,,2000
+5,Kia,Sonet,2020,Petrol,Manual,SUV,19,1000
+"""
+
+
+def run_clean(tmp_path, chunk_rows):
+
+    source = tmp_path / "raw.csv"
+    source.write_text(RAW)
+
+    out = tmp_path / "out"
+    out.mkdir(exist_ok=True)
+
+    rows = cleaning.clean(
+        str(source),
+        str(out / "cleaned.csv"),
+        str(out / "cbf.csv"),
+        str(out / "catalog"),
+        workers=1,
+        chunk_rows=chunk_rows
+    )
+
+    return rows, out
+
+
+def test_streamed_catalog_matches_the_cbf_csv(tmp_path):
+
+    rows, out = run_clean(tmp_path, chunk_rows=2)
+
+    assert rows == 5
+
+    streamed = ColumnarCatalog.load(str(out / "catalog"))
+    expected = ColumnarCatalog.from_frame(pd.read_csv(out / "cbf.csv"))
+
+    assert streamed.dictionaries == expected.dictionaries
+
+    for col in expected.codes:
+        assert streamed.codes[col].dtype == expected.codes[col].dtype
+        assert np.array_equal(streamed.codes[col], expected.codes[col])
+
+    for col in expected.numerics:
+        assert streamed.numerics[col].dtype == expected.numerics[col].dtype
+        assert np.array_equal(streamed.numerics[col], expected.numerics[col])
+
+    # Part files and temp directories are all gone.
+    assert sorted(os.listdir(out)) == ["catalog", "cbf.csv", "cleaned.csv"]
+
+
+def test_rebuild_replaces_the_catalog(tmp_path):
+
+    _, out = run_clean(tmp_path, chunk_rows=2)
+
+    first = ColumnarCatalog.load(str(out / "catalog"))
+
+    run_clean(tmp_path, chunk_rows=3)
+
+    # A worker that mapped the old build still reads it.
+    assert first.values("Brand", [0]) == ["kia"]
+    assert ColumnarCatalog.load(str(out / "catalog")).values("Model", [4]) == ["sonet"]
+
+
+def test_model_artifacts_build_from_the_catalog(tmp_path):
+
+    _, out = run_clean(tmp_path, chunk_rows=2)
+
+    from_csv = model_artifacts.load_artifacts(
+        model_artifacts.build_artifacts(str(out / "cbf.csv"), str(tmp_path / "a"))
+    )
+    from_catalog = model_artifacts.load_artifacts(
+        model_artifacts.build_artifacts(str(out / "catalog"), str(tmp_path / "b"))
+    )
+
+    assert (from_csv["matrix_t"] != from_catalog["matrix_t"]).nnz == 0
+
+    csv_catalog = from_csv["features"]["catalog"]
+    catalog = from_catalog["features"]["catalog"]
+
+    for col in ["Brand", "Model"]:
+        assert csv_catalog.values(col, [0, 1, 2]) == catalog.values(col, [0, 1, 2])
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+from starlette.testclient import TestClient
+
+import app
+import asgi
+import export
+from export import EXPORT_FIELDS, export_stream, iter_interactions
+
+
+def make_interactions(count):
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+
+    start = datetime(2026, 1, 1)
+
+    collection.insert_many([
+        {
+            "_id": ObjectId.from_datetime(start + timedelta(minutes=i)),
+            "user_id": ObjectId(),
+            "car_id": ObjectId(),
+            "action": "view",
+            "timestamp": start + timedelta(minutes=i, milliseconds=250)
+        }
+        for i in range(count)
+    ])
+
+    return collection
+
+
+def read(fmt, collection, **kwargs):
+
+    chunks, mimetype = export_stream(fmt, collection=collection, **kwargs)
+
+    return "".join(chunks), mimetype
+
+
+def test_pages_cover_every_interaction_once():
+
+    collection = make_interactions(7)
+
+    expected = [d["_id"] for d in collection.find().sort("_id", 1)]
+
+    for page_size in [1, 3, 7, 10]:
+        assert [d["_id"] for d in iter_interactions(collection, page_size=page_size)] == expected
+
+
+def test_ndjson_lists_every_interaction_in_id_order():
+
+    collection = make_interactions(7)
+
+    body, mimetype = read("ndjson", collection)
+    records = [json.loads(line) for line in body.splitlines()]
+
+    assert mimetype == "application/x-ndjson"
+    assert [r["_id"] for r in records] == [str(d["_id"]) for d in collection.find().sort("_id", 1)]
+    assert set(records[0]) == set(EXPORT_FIELDS)
+    assert records[0]["timestamp"] == "2026-01-01T00:00:00.250Z"
+
+
+def test_csv_has_a_header_and_one_row_per_interaction(monkeypatch):
+
+    collection = make_interactions(5)
+
+    monkeypatch.setattr(export, "EXPORT_CSV_CHUNK", 2)
+
+    body, mimetype = read("csv", collection)
+    rows = list(csv.DictReader(io.StringIO(body)))
+
+    assert mimetype == "text/csv"
+    assert body.splitlines()[0] == ",".join(EXPORT_FIELDS)
+    assert len(rows) == 5
+    assert rows[-1]["timestamp"] == "2026-01-01T00:04:00.250Z"
+
+
+def test_resumes_from_since_and_after():
+
+    collection = make_interactions(6)
+    ids = [str(d["_id"]) for d in collection.find().sort("_id", 1)]
+
+    body, _ = read("ndjson", collection, after=ids[3])
+
+    assert [json.loads(line)["_id"] for line in body.splitlines()] == ids[4:]
+
+    body, _ = read("ndjson", collection, since="2026-01-01T00:02:00Z")
+
+    assert [json.loads(line)["_id"] for line in body.splitlines()] == ids[2:]
+
+    # Both: the later of the two cursors wins.
+    body, _ = read("ndjson", collection, since="2026-01-01T00:02:00+00:00", after=ids[4])
+
+    assert [json.loads(line)["_id"] for line in body.splitlines()] == ids[5:]
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"fmt": "xml"},
+    {"since": "yesterday"},
+    {"after": "not-an-id"},
+])
+def test_bad_arguments_raise_before_any_query(kwargs):
+
+    with pytest.raises(ValueError):
+        export_stream(collection=None, **kwargs)
+
+
+def test_routes_check_the_key_then_the_arguments(monkeypatch):
+
+    collection = make_interactions(2)
+
+    def stream(fmt, since=None, after=None):
+        return export_stream(fmt, since=since, after=after, collection=collection)
+
+    monkeypatch.setattr(export, "EXPORT_API_KEY", "secret")
+    monkeypatch.setattr(app, "export_stream", stream)
+    monkeypatch.setattr(asgi, "export_stream", stream)
+
+    flask_client = app.app.test_client()
+    asgi_client = TestClient(asgi.app)
+
+    for client in [flask_client, asgi_client]:
+
+        assert client.get("/api/interactions/export").status_code == 403
+        assert client.get("/api/interactions/export", headers={"X-API-Key": "wrong"}).status_code == 403
+
+        key = {"X-API-Key": "secret"}
+
+        assert client.get("/api/interactions/export?format=xml", headers=key).status_code == 400
+        assert client.get("/api/interactions/export?since=soon", headers=key).status_code == 400
+
+        response = client.get("/api/interactions/export?format=csv", headers=key)
+
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/csv")
+        assert len(response.text.splitlines()) == 3
+
+
+def test_export_is_off_without_a_key(monkeypatch):
+
+    monkeypatch.setattr(export, "EXPORT_API_KEY", None)
+
+    assert not export.export_allowed("")
+    assert not export.export_allowed(None)
@@ -0,0 +1,116 @@
+import mongomock
+import pytest
+from bson import ObjectId
+
+import hybrid
+from catalog_cache import CatalogCache
+from cf_recommender import CFModel
+from hybrid import HYBRID_CF_POOL, HYBRID_WEIGHTS, recommend_hybrid, resolve_weights
+from recommender import recommend_cbf
+
+
+PAIRS = [("Kia", "Seltos"), ("Honda", "City")]
+
+
+@pytest.fixture
+def world(monkeypatch):
+
+    # Two catalog cars; the first has three renters, the second one.
+    database = mongomock.MongoClient()["car_rental_db"]
+
+    car_ids = [ObjectId() for _ in PAIRS]
+
+    database["cars"].insert_many([
+        {"_id": car_id, "Brand": brand, "Model": model}
+        for car_id, (brand, model) in zip(car_ids, PAIRS)
+    ])
+
+    database["interactions"].insert_many(
+        [{"user_id": ObjectId(), "car_id": car_ids[0], "action": "view"} for _ in range(3)] +
+        [{"user_id": ObjectId(), "car_id": car_ids[1], "action": "view"}]
+    )
+
+    model = CFModel(database["interactions"])
+    model.refresh(force=True)
+    monkeypatch.setattr(model, "start", lambda: None)
+
+    monkeypatch.setattr(hybrid, "cf_model", model)
+    monkeypatch.setattr(hybrid, "catalog", CatalogCache(database["cars"]))
+    monkeypatch.setattr(hybrid, "car_pairs", hybrid.CarPairs())
+
+    return [str(car_id) for car_id in car_ids]
+
+
+def pair(record):
+
+    return record["Brand"].lower(), record["Model"].lower()
+
+
+def test_overrides_replace_the_defaults():
+
+    weights = resolve_weights({"cf": "0.5"})
+
+    assert weights == dict(HYBRID_WEIGHTS, cf=0.5)
+
+
+@pytest.mark.parametrize("overrides", [
+    {"content": "nan"},
+    {"cf": float("inf")},
+    {"popularity": -1},
+    {"novelty": 1},
+    {"content": 0, "cf": 0, "popularity": 0},
+])
+def test_bad_weights_are_rejected(overrides):
+
+    with pytest.raises(ValueError):
+        resolve_weights(overrides)
+
+
+@pytest.mark.parametrize("prefs", [
+    {},
+    {"Brand": "Kia", "Fuel_Type": "Petrol"},
+    {"Body_Type": "SUV", "Mileage": "High", "Engine_CC": "Low Power"},
+])
+def test_content_only_matches_the_cbf_ranking(world, prefs):
+
+    blended = recommend_hybrid(prefs, top_n=5, weights={"content": 1, "cf": 0, "popularity": 0})
+    expected = recommend_cbf(prefs, top_n=5)
+
+    for record in blended:
+        contributions = record.pop("contributions")
+        assert contributions["cf"] == contributions["popularity"] == 0
+        assert contributions["content"] == pytest.approx(record["final_score"])
+
+    assert [pair(r) for r in blended] == [pair(r) for r in expected]
+    assert [r["final_score"] for r in blended] == pytest.approx([r["final_score"] for r in expected])
+
+
+def test_popularity_signal_follows_interaction_counts(world):
+
+    results = recommend_hybrid({}, top_n=3, weights={"content": 0, "cf": 0, "popularity": 1})
+
+    by_pair = {pair(r): r["contributions"]["popularity"] for r in results}
+
+    assert pair(results[0]) == ("kia", "seltos")
+    assert by_pair[("kia", "seltos")] == pytest.approx(1)
+    assert by_pair.get(("honda", "city")) == pytest.approx(1 / 3)
+
+
+def test_cf_signal_comes_from_the_configured_model(world, monkeypatch):
+
+    calls = []
+
+    def rank(user_id, top_n):
+        calls.append(top_n)
+        return [(world[1], 2.0), (world[0], -1.0)], None
+
+    monkeypatch.setattr(hybrid, "rank_cf", rank)
+
+    results = recommend_hybrid({}, user_id=ObjectId(), top_n=3, weights={"content": 0, "cf": 1, "popularity": 0})
+
+    assert calls == [HYBRID_CF_POOL]
+    assert pair(results[0]) == ("honda", "city")
+    assert results[0]["contributions"] == {"content": 0, "cf": pytest.approx(1), "popularity": 0}
+
+    # A negative score (possible with ALS) adds nothing.
+    assert all(r["contributions"]["cf"] == 0 for r in results[1:])
@@ -0,0 +1,110 @@
+import mongomock
+from pymongo import MongoClient
+
+from indexes import INDEXES, check_query_plans, ensure_indexes, plan_stages
+
+
+def test_ensure_indexes_creates_every_index():
+
+    database = mongomock.MongoClient()["car_rental_db"]
+
+    assert ensure_indexes(database) == []
+
+    for name, indexes in INDEXES.items():
+
+        created = [
+            info["key"] for info in database[name].index_information().values()
+        ]
+
+        for keys, _ in indexes:
+            assert keys in created
+
+
+def test_ensure_indexes_is_idempotent():
+
+    database = mongomock.MongoClient()["car_rental_db"]
+
+    ensure_indexes(database)
+
+    assert ensure_indexes(database) == []
+
+
+def test_unreachable_server_is_reported_not_raised():
+
+    client = MongoClient("mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100")
+
+    failures = ensure_indexes(client["car_rental_db"])
+
+    # Stops at the first connection failure instead of timing out per index.
+    assert len(failures) == 1
+
+
+def test_app_imports_without_mongo():
+
+    import app
+
+    assert app.app.name == "app"
+
+
+def test_plan_stages_finds_nested_collscan():
+
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]
+        }
+    }
+
+    assert list(plan_stages(plan)) == ["FETCH", "OR", "IXSCAN", "COLLSCAN"]
+
+
+class ExplainedCursor:
+
+    def __init__(self, stage):
+
+        self.stage = stage
+
+    def sort(self, *args):
+
+        return self
+
+    def explain(self):
+
+        return {"queryPlanner": {"winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": self.stage}
+        }}}
+
+
+class ExplainedCollection:
+
+    def __init__(self, stage):
+
+        self.stage = stage
+
+    def find(self, *args):
+
+        return ExplainedCursor(self.stage)
+
+
+class ExplainedDatabase:
+
+    # mongomock has no query planner; each collection answers explain()
+    # with a fixed winning plan instead.
+    def __init__(self, stages):
+
+        self.stages = stages
+
+    def __getitem__(self, name):
+
+        return ExplainedCollection(self.stages.get(name, "IXSCAN"))
+
+
+def test_check_query_plans_reports_collection_scans():
+
+    assert check_query_plans(ExplainedDatabase({})) == []
+
+    failures = check_query_plans(ExplainedDatabase({"interactions": "COLLSCAN"}))
+
+    assert failures == ["user interactions", "CF refresh"]
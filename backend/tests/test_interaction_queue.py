@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import mongomock
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import services
+import user_stats
+from interaction_queue import InteractionQueue
+from tokens import issue_token
+from user_stats import stats_updates
+
+
+def event(action="view", _id=None):
+
+    doc = {
+        "user_id": ObjectId(),
+        "car_id": ObjectId(),
+        "action": action,
+        "timestamp": datetime.utcnow()
+    }
+
+    if _id is not None:
+        doc["_id"] = _id
+
+    return doc
+
+
+def make_queue(on_flush):
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+
+    return InteractionQueue(collection, on_flush=on_flush), collection
+
+
+def test_stats_follow_only_the_inserted_docs():
+
+    flushed = []
+    queue, collection = make_queue(flushed.extend)
+
+    taken = ObjectId()
+    collection.insert_one(event(_id=taken))
+
+    batch = [event(), event(_id=taken), event()]
+    queue.write(batch)
+
+    assert flushed == [batch[0], batch[2]]
+    assert queue.stats()["flushed"] == 2
+    assert queue.stats()["failed"] == 1
+
+
+def test_failed_stats_update_does_not_count_as_failed_flush():
+
+    def on_flush(docs):
+        raise RuntimeError("user_stats unavailable")
+
+    queue, collection = make_queue(on_flush)
+
+    queue.write([event(), event()])
+
+    assert collection.count_documents({}) == 2
+    assert queue.stats()["flushed"] == 2
+    assert queue.stats()["failed"] == 0
+
+
+def test_unknown_actions_are_rejected():
+
+    token = issue_token(str(ObjectId()))
+
+    for action in ["bad.action", "$x", "", None]:
+        body, status = services.interact({"action": action}, token)
+        assert status == 400
+
+
+def test_stats_never_build_nested_action_fields():
+
+    docs = [event("bad.action"), event("$x"), event("")]
+
+    assert stats_updates(docs) == [
+        UpdateOne(
+            {"_id": doc["user_id"]},
+            {"$inc": {"total": 1}, "$max": {"last_seen": doc["timestamp"]}},
+            upsert=True
+        )
+        for doc in docs
+    ]
+
+
+def test_booking_is_reported_once_stored_even_if_stats_fail(monkeypatch):
+
+    import interactions
+
+    collection = mongomock.MongoClient()["car_rental_db"]["interactions"]
+
+    def failing_stats(docs):
+        raise RuntimeError("user_stats unavailable")
+
+    monkeypatch.setattr(interactions, "interactions_col", collection)
+    monkeypatch.setattr(interactions, "record_interactions", failing_stats)
+
+    body, status = services.book(
+        {"car_id": str(ObjectId())},
+        issue_token(str(ObjectId()))
+    )
+
+    assert (body, status) == ({"success": True}, 200)
+    assert collection.count_documents({"action": "book"}) == 1
+
+
+def test_rebuild_swaps_in_fresh_counters(monkeypatch):
+
+    database = mongomock.MongoClient()["car_rental_db"]
+
+    live = database["user_stats"]
+    live.insert_one({"_id": "stale", "total": 99})
+
+    user = ObjectId()
+    database["interactions"].insert_many([dict(event("view"), user_id=user), dict(event("book"), user_id=user)])
+
+    def record(docs, collection):
+
+        # The live counters stay readable while the new ones are built.
+        assert live.find_one({"_id": "stale"})
+
+        # mongomock's bulk_write does not take pymongo's UpdateOne.
+        for op in stats_updates(docs):
+            collection.update_one(op._filter, op._doc, upsert=True)
+
+    monkeypatch.setattr(user_stats, "record_interactions", record)
+
+    user_stats.rebuild_user_stats(live, database["interactions"])
+
+    assert live.find_one({"_id": "stale"}) is None
+    assert live.find_one({"_id": user})["total"] == 2
+    assert "user_stats_rebuild" not in database.list_collection_names()
@@ -0,0 +1,48 @@
+import services
+from rate_limit import RateLimiter
+
+
+def no_such_user(email, password):
+
+    return None
+
+
+def test_shared_frontend_address_is_not_throttled_by_default(monkeypatch):
+
+    monkeypatch.setattr(services, "login_user", no_such_user)
+    monkeypatch.setattr(services, "ip_limiter", RateLimiter(1, 1))
+
+    # Every login comes through the Streamlit host.
+    for i in range(30):
+        body, status = services.login(
+            {"email": f"user{i}@example.com", "password": "x"},
+            "10.0.0.5"
+        )
+        assert status == 401
+
+
+def test_ip_limit_is_opt_in(monkeypatch):
+
+    monkeypatch.setattr(services, "login_user", no_such_user)
+    monkeypatch.setattr(services, "ip_limiter", RateLimiter(1, 1))
+    monkeypatch.setattr(services, "LOGIN_IP_LIMIT", True)
+
+    statuses = [
+        services.login({"email": f"user{i}@example.com", "password": "x"}, "10.0.0.5")[1]
+        for i in range(3)
+    ]
+
+    assert statuses == [401, 429, 429]
+
+
+def test_email_bucket_still_applies(monkeypatch):
+
+    monkeypatch.setattr(services, "login_user", no_such_user)
+    monkeypatch.setattr(services, "email_limiter", RateLimiter(1, 2))
+
+    statuses = [
+        services.login({"email": "same@example.com", "password": "x"}, "10.0.0.5")[1]
+        for _ in range(3)
+    ]
+
+    assert statuses == [401, 401, 429]
@@ -0,0 +1,33 @@
+import pytest
+
+from password_pool import PasswordPool, PasswordPoolBusy
+
+
+def test_hashes_and_checks_in_clean_worker_processes():
+
+    pool = PasswordPool(workers=1)
+
+    try:
+        hashed = pool.hash("hunter2", rounds=4)
+
+        assert pool.check("hunter2", hashed)
+        assert not pool.check("hunter3", hashed)
+
+        assert pool.get_executor()._mp_context.get_start_method() in ("forkserver", "spawn")
+
+    finally:
+        pool.shutdown()
+
+    assert pool.executor is None
+
+
+def test_full_queue_is_refused_and_counted():
+
+    pool = PasswordPool(workers=1, queue_limit=0)
+
+    for _ in range(3):
+        with pytest.raises(PasswordPoolBusy):
+            pool.hash("hunter2", rounds=4)
+
+    assert pool.rejected == 3
+    assert pool.executor is None
@@ -0,0 +1,79 @@
+import json
+import os
+
+import numpy as np
+
+from precompute import PrecomputedRecommendations, PrecomputedStore, load_precomputed, publish
+
+
+def write_build(path, version, fill):
+
+    os.makedirs(path)
+
+    np.save(os.path.join(path, "rows.npy"), np.full((2, 3), fill, dtype=np.int32))
+    np.save(os.path.join(path, "scores.npy"), np.full((2, 3), fill, dtype=np.float64))
+
+    with open(os.path.join(path, "keys.json"), "w") as f:
+        json.dump({"version": version, "top_n": 3, "keys": [["a"], ["b"]]}, f)
+
+
+def test_publish_leaves_mapped_builds_intact(tmp_path):
+
+    path = str(tmp_path / "precomputed")
+
+    write_build(path, "v1", 1)
+
+    live = PrecomputedRecommendations(path)
+
+    write_build(str(tmp_path / "next"), "v2", 2)
+    publish(str(tmp_path / "next"), path)
+
+    # The worker still serving the old build reads the old rows.
+    assert live.lookup(("a",), 3)[0].tolist() == [1, 1, 1]
+
+    assert load_precomputed("v1", path) is None
+    assert load_precomputed("v2", path).lookup(("b",), 3)[0].tolist() == [2, 2, 2]
+
+    assert sorted(os.listdir(tmp_path)) == ["precomputed"]
+
+
+def test_missing_or_mismatched_build_is_ignored(tmp_path):
+
+    path = str(tmp_path / "precomputed")
+
+    assert load_precomputed("v1", path) is None
+
+    write_build(path, "v1", 1)
+
+    with open(os.path.join(path, "keys.json"), "w") as f:
+        json.dump({"version": "v1", "top_n": 3, "keys": [["a"]]}, f)
+
+    assert load_precomputed("v1", path) is None
+
+
+def test_store_picks_up_a_new_build(tmp_path):
+
+    path = str(tmp_path / "precomputed")
+    store = PrecomputedStore(path, reload_interval=0)
+
+    # Nothing published yet: workers rank live until a build appears.
+    assert store.get("v1") is None
+
+    write_build(str(tmp_path / "first"), "v1", 1)
+    publish(str(tmp_path / "first"), path)
+
+    assert store.get("v1").lookup(("a",), 3)[0].tolist() == [1, 1, 1]
+
+    write_build(str(tmp_path / "second"), "v1", 2)
+    publish(str(tmp_path / "second"), path)
+
+    assert store.get("v1").lookup(("a",), 3)[0].tolist() == [2, 2, 2]
+
+    # A build for another catalog version is not served to a worker
+    # still on the old one.
+    write_build(str(tmp_path / "third"), "v2", 3)
+    publish(str(tmp_path / "third"), path)
+
+    assert store.get("v1").lookup(("a",), 3)[0].tolist() == [2, 2, 2]
+    assert store.get("v2").lookup(("a",), 3)[0].tolist() == [3, 3, 3]
+    assert store.get("v1") is None
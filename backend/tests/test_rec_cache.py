@@ -0,0 +1,133 @@
+import copy
+
+import pytest
+
+import cf_recommender
+import rec_cache
+import recommender
+from precompute import PrecomputedStore
+from rec_cache import LRUCache
+from recommender import get_engine, recommend_cbf
+
+
+class Clock:
+
+    def __init__(self):
+
+        self.now = 1000.0
+
+    def __call__(self):
+
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+
+    cache = LRUCache(maxsize=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    assert cache.get("a") == (True, 1)
+
+    cache.put("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+
+    clock = Clock()
+    monkeypatch.setattr(rec_cache.time, "monotonic", clock)
+
+    cache = LRUCache(maxsize=10, ttl=30)
+    cache.put("a", 1)
+
+    clock.now += 29
+    assert cache.get("a") == (True, 1)
+
+    clock.now += 1
+    assert cache.get("a") == (False, None)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_equivalent_preferences_share_a_key():
+
+    engine = get_engine()
+
+    key = engine.cache_key({"Brand": "Kia", "Fuel_Type": "Petrol"}, 5)
+
+    # Case, key order, "Any" bands and unused fields do not matter.
+    assert key == engine.cache_key({"Fuel_Type": "petrol", "Mileage": "Any", "Brand": "KIA", "extra": 1}, 5)
+
+    assert key != engine.cache_key({"Brand": "Kia", "Fuel_Type": "Petrol"}, 3)
+    assert key != engine.cache_key({"Brand": "Kia", "Fuel_Type": "Diesel"}, 5)
+
+
+@pytest.fixture
+def counted_engine(monkeypatch, tmp_path):
+
+    # Live ranking only, into a fresh cache, counting engine calls.
+    engine = copy.copy(get_engine())
+    calls = []
+
+    def recommend(prefs, top_n):
+        calls.append(engine.version)
+        return [{"version": engine.version}]
+
+    engine.recommend = recommend
+
+    monkeypatch.setattr(recommender, "engine", engine)
+    monkeypatch.setattr(recommender, "cbf_cache", LRUCache(16))
+    monkeypatch.setattr(recommender, "precomputed", PrecomputedStore(str(tmp_path)))
+
+    return engine, calls
+
+
+def test_cached_results_follow_the_catalog_version(counted_engine):
+
+    engine, calls = counted_engine
+
+    first = recommend_cbf({"Brand": "Kia"}, 5)
+
+    # A hit hands out copies, so callers cannot change the cached value.
+    first[0]["version"] = "changed"
+
+    assert recommend_cbf({"brand": "ignored", "Brand": "kia"}, 5) == [{"version": engine.version}]
+    assert len(calls) == 1
+
+    # A new catalog build changes the version, so old entries never match.
+    engine.version = "next"
+
+    assert recommend_cbf({"Brand": "Kia"}, 5) == [{"version": "next"}]
+    assert len(calls) == 2
+
+
+def test_cf_results_are_cached_per_user_for_a_short_ttl(monkeypatch):
+
+    clock = Clock()
+    monkeypatch.setattr(rec_cache.time, "monotonic", clock)
+
+    calls = []
+
+    def compute(user_id, top_n):
+        calls.append(user_id)
+        return [{"user": str(user_id)}]
+
+    monkeypatch.setattr(cf_recommender, "compute_cf", compute)
+    monkeypatch.setattr(cf_recommender, "cf_cache", LRUCache(16, ttl=30))
+
+    cf_recommender.recommend_cf("alice", 3)
+    cf_recommender.recommend_cf("alice", 3)
+    cf_recommender.recommend_cf("bob", 3)
+
+    assert calls == ["alice", "bob"]
+
+    clock.now += 30
+    cf_recommender.recommend_cf("alice", 3)
+
+    assert calls == ["alice", "bob", "alice"]
@@ -0,0 +1,66 @@
+from bson import ObjectId
+
+import services
+from tokens import issue_token
+
+
+def batch(data, token=None):
+
+    return services.recommend_batch(data, token)
+
+
+def test_requires_a_session_token():
+
+    body, status = batch({"user_id": str(ObjectId()), "preferences": [{}]})
+
+    assert status == 401
+
+    body, status = batch({"preferences": [{}]}, "not-a-token")
+
+    assert status == 401
+
+
+def test_rejects_bad_input_before_ranking(monkeypatch):
+
+    monkeypatch.setattr(services, "recommend_cbf_batch", None)
+
+    token = issue_token(str(ObjectId()))
+
+    for data in [
+        None,
+        {"preferences": {}},
+        {"preferences": [{}] * (services.BATCH_MAX_PREFERENCES + 1)},
+        {"preferences": [{}, "Kia"]},
+        {"preferences": [{}], "top_n": "many"},
+        {"preferences": [{}], "top_n": None},
+        {"preferences": [{}], "top_n": 0},
+        {"preferences": [{}], "top_n": services.MAX_TOP_N + 1},
+    ]:
+        body, status = batch(data, token)
+        assert status == 400, data
+
+
+def test_valid_batch_is_ranked(monkeypatch):
+
+    calls = []
+
+    def ranked(prefs_list, top_n):
+        calls.append((prefs_list, top_n))
+        return [[] for _ in prefs_list]
+
+    monkeypatch.setattr(services, "recommend_cbf_batch", ranked)
+
+    token = issue_token(str(ObjectId()))
+
+    body, status = batch({"preferences": [{"Brand": "kia"}], "top_n": "4"}, token)
+
+    assert status == 200
+    assert body == {"results": [[]]}
+    assert calls == [([{"Brand": "kia"}], 4)]
+
+
+def test_blended_rejects_bad_top_n():
+
+    body, status = services.recommend_blended({"top_n": "x"}, issue_token(str(ObjectId())))
+
+    assert status == 400
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from model_artifacts import CBF_CSV_PATH, build_artifacts, load_artifacts
+from recommender import CBFEngine
+
+
+PREFS = [
+    {},
+    {"Brand": "Kia"},
+    {"Brand": "Toyota", "Fuel_Type": "Diesel", "Body_Type": "SUV"},
+    {"Fuel_Type": "Electric", "Mileage": "High"},
+    {"Brand": "BMW", "Body_Type": "Sedan", "Engine_CC": "High Power"},
+    {"Brand": "Maruti", "Mileage": "Low", "Engine_CC": "Low Power"},
+]
+
+QUERIES = ["car", "kia petrol suv", "bmw bmw sedan", "the electric", "unknown words only"]
+
+
+@pytest.fixture(scope="module")
+def reference():
+
+    # The sklearn pipeline recommend_cbf replaced, fitted on the same CSV.
+    df = pd.read_csv(CBF_CSV_PATH)
+
+    df.fillna("", inplace=True)
+
+    for col in ["Mileage", "Engine_CC", "Year"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+    for col in ["Brand", "Fuel_Type", "Body_Type"]:
+        df[col] = df[col].astype(str).str.lower()
+
+    tfidf = TfidfVectorizer(stop_words="english")
+    matrix = tfidf.fit_transform(df["Brand"] + " " + df["Fuel_Type"] + " " + df["Body_Type"])
+
+    return df, tfidf, matrix
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+
+    model = load_artifacts(build_artifacts(CBF_CSV_PATH, str(tmp_path_factory.mktemp("artifacts"))))
+
+    return CBFEngine(model["vectorizer"], model["matrix_t"], model["features"], model["version"])
+
+
+def band(values, edges, labels, label):
+
+    if label not in labels:
+        return np.ones(len(values), dtype=bool)
+
+    i = labels.index(label)
+
+    return (values >= edges[i]) & (values < edges[i + 1])
+
+
+def reference_ranking(reference, prefs, top_n):
+
+    df, tfidf, matrix = reference
+
+    user_brand = prefs.get("Brand", "").lower()
+    user_text = " ".join([prefs.get(c, "") for c in ["Brand", "Fuel_Type", "Body_Type"]]).lower()
+
+    if not user_text.strip():
+        user_text = "car"
+
+    scored = df.assign(
+        final_score=cosine_similarity(tfidf.transform([user_text]), matrix)[0] * 0.7 + (
+            (df["Mileage"] / df["Mileage"].max()) * 0.3 +
+            (df["Engine_CC"] / df["Engine_CC"].max()) * 0.2
+        ) * 0.3
+    )
+
+    keep = band(scored["Mileage"], [0, 15, 22, np.inf], ["Low", "Medium", "High"], prefs.get("Mileage"))
+    keep &= band(scored["Engine_CC"], [0, 1200, 2000, np.inf], ["Low Power", "Medium Power", "High Power"], prefs.get("Engine_CC"))
+
+    filtered = scored[keep] if keep.any() else scored
+    ranked = filtered.drop_duplicates(subset=["Brand", "Model"]).sort_values("final_score", ascending=False)
+
+    same = ranked[ranked["Brand"] == user_brand].head(2)
+    seen = set(same["Model"])
+    others = []
+
+    for _, row in ranked[ranked["Brand"] != user_brand].iterrows():
+
+        if len(others) == top_n - len(same):
+            break
+
+        if row["Model"] not in seen:
+            others.append(row)
+            seen.add(row["Model"])
+
+    return pd.concat([same, pd.DataFrame(others)]).head(top_n).to_dict(orient="records")
+
+
+def test_query_vectorizer_matches_tfidf_transform(reference, engine):
+
+    _, tfidf, _ = reference
+
+    assert engine.vectorizer.vocabulary == {k: int(v) for k, v in tfidf.vocabulary_.items()}
+
+    np.testing.assert_allclose(
+        engine.vectorizer.transform(QUERIES).toarray(),
+        tfidf.transform(QUERIES).toarray()
+    )
+
+
+@pytest.mark.parametrize("prefs", PREFS)
+def test_ranking_matches_the_sklearn_baseline(reference, engine, prefs):
+
+    got = engine.recommend(prefs, 5)
+    expected = reference_ranking(reference, prefs, 5)
+
+    # Rows with equal scores may come back in either order, so compare the
+    # scores in rank order, and the cars only above the last tied score.
+    got_scores = [r["final_score"] for r in got]
+    expected_scores = [r["final_score"] for r in expected]
+
+    assert got_scores == pytest.approx(expected_scores)
+
+    cutoff = expected_scores[-1] + 1e-9
+
+    def clear_winners(records):
+        return {
+            (r["Brand"].lower(), str(r["Model"]).lower())
+            for r in records if r["final_score"] > cutoff
+        }
+
+    assert clear_winners(got) == clear_winners(expected)
@@ -0,0 +1,70 @@
+import mongomock
+
+from seed_data import seed_cars
+
+
+class BulkCollection:
+
+    # mongomock's bulk_write does not take current pymongo UpdateOne
+    # objects, so apply each one through update_one instead.
+    def __init__(self, collection):
+
+        self.collection = collection
+
+    def bulk_write(self, ops, ordered=True):
+
+        upserted = modified = 0
+
+        for op in ops:
+            result = self.collection.update_one(op._filter, op._doc, upsert=op._upsert)
+            upserted += result.upserted_id is not None
+            modified += result.modified_count
+
+        return type("Result", (), {"upserted_count": upserted, "modified_count": modified})
+
+
+def write_csv(path, price):
+
+    path.write_text(
+        "Brand,Model,Body_Type,Fuel_Type,Mileage,Engine_CC,price\n"
+        f"Kia,Rio,Hatchback,Petrol,18,1200,{price}\n"
+        "Tata,Nexon,SUV,Petrol,17,1200,1800\n"
+    )
+
+
+def version(meta):
+
+    doc = meta.find_one({"_id": "catalog_version"})
+
+    return doc["version"] if doc else 0
+
+
+def test_csv_edits_reach_existing_cars(tmp_path):
+
+    database = mongomock.MongoClient()["car_rental_db"]
+    cars, meta = database["cars"], database["meta"]
+
+    path = tmp_path / "cars.csv"
+    write_csv(path, 1500)
+
+    assert seed_cars(path, cars_collection=BulkCollection(cars), meta_collection=meta) == 2
+    assert version(meta) == 1
+
+    # Defaults only fill fields the CSV lacks, and only on insert.
+    rio = cars.find_one({"Model": "Rio"})
+    assert rio["Seating_Capacity"] == 5
+    cars.update_one({"_id": rio["_id"]}, {"$set": {"Seating_Capacity": 4}})
+
+    write_csv(path, 1650)
+
+    assert seed_cars(path, cars_collection=BulkCollection(cars), meta_collection=meta) == 1
+    assert version(meta) == 2
+
+    rio = cars.find_one({"Model": "Rio"})
+    assert rio["price"] == 1650
+    assert rio["Seating_Capacity"] == 4
+    assert cars.count_documents({}) == 2
+
+    # Re-seeding identical values changes nothing, so no version bump.
+    assert seed_cars(path, force=True, cars_collection=BulkCollection(cars), meta_collection=meta) == 0
+    assert version(meta) == 2
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+from bson import ObjectId
+
+import tokens
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(tokens.__file__))
+
+
+def import_tokens(**env):
+
+    # A fresh interpreter; an empty SESSION_SECRET also keeps a local
+    # .env from supplying one.
+    return subprocess.run(
+        [sys.executable, "-c", "import tokens"],
+        cwd=BACKEND_DIR,
+        env=dict(env, PATH=os.environ.get("PATH", ""), SESSION_SECRET=""),
+        capture_output=True,
+        text=True
+    )
+
+
+def test_missing_secret_stops_startup():
+
+    result = import_tokens()
+
+    assert result.returncode != 0
+    assert "SESSION_SECRET is not set" in result.stderr
+
+
+def test_dev_mode_allows_a_throwaway_key():
+
+    assert import_tokens(SESSION_DEV_MODE="1").returncode == 0
+
+
+def test_tokens_round_trip():
+
+    token = tokens.issue_token("abc", cf=True)
+
+    assert tokens.verify_token(token)["uid"] == "abc"
+    assert tokens.verify_token(token + "x") is None
+
+
+def test_user_routes_require_a_token():
+
+    import app
+
+    client = app.app.test_client()
+    user_id = str(ObjectId())
+
+    # A user_id in the body is not proof of who is asking.
+    for path in ["/api/book", "/api/interact", "/api/recommend", "/api/recommend/hybrid"]:
+        response = client.post(path, json={"user_id": user_id, "car_id": str(ObjectId()), "action": "view"})
+        assert response.status_code == 401, path
+
+    assert client.get(f"/api/user-bookings/{user_id}").status_code == 401
+
+    other = tokens.issue_token(str(ObjectId()))
+
+    response = client.get(
+        f"/api/user-bookings/{user_id}",
+        headers={"Authorization": f"Bearer {other}"}
+    )
+
+    assert response.status_code == 403
@@ -0,0 +1,97 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+
+# A random per-process key, for a single local process only: tokens then
+# stop verifying on restart and in every other worker.
+SESSION_DEV_MODE = os.getenv("SESSION_DEV_MODE", "0") == "1"
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 7 * 24 * 3600))
+
+logger = logging.getLogger(__name__)
+
+if not SESSION_SECRET:
+
+    if not SESSION_DEV_MODE:
+        raise RuntimeError(
+            "SESSION_SECRET is not set (see backend/.env.example); "
+            "set SESSION_DEV_MODE=1 to use a throwaway key locally"
+        )
+
+    logger.warning("SESSION_SECRET is not set; using a random per-process key")
+    SESSION_SECRET = secrets.token_hex(32)
+
+SESSION_KEY = SESSION_SECRET.encode("utf-8")
+
+
+class InvalidSession(Exception):
+    pass
+
+
+def b64encode(data):
+
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64decode(text):
+
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def sign(payload):
+
+    return hmac.new(SESSION_KEY, payload.encode("ascii"), hashlib.sha256).digest()
+
+
+def issue_token(user_id, ttl=SESSION_TTL, **flags):
+
+    # <payload>.<signature>, both base64url; the payload is compact JSON
+    # with the user id ("uid"), expiry ("exp") and any cached flags.
+    claims = dict(flags, uid=str(user_id), exp=int(time.time()) + ttl)
+
+    payload = b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+
+    return payload + "." + b64encode(sign(payload))
+
+
+def verify_token(token):
+
+    # The claims if the token is ours and unexpired, else None. Only a
+    # hash and a JSON parse: no database round-trip.
+    try:
+        payload, signature = token.split(".")
+
+        if not hmac.compare_digest(b64decode(signature), sign(payload)):
+            return None
+
+        claims = json.loads(b64decode(payload))
+
+    except (AttributeError, ValueError, UnicodeError):
+        return None
+
+    if not isinstance(claims, dict) or "uid" not in claims:
+        return None
+
+    if claims.get("exp", 0) < time.time():
+        return None
+
+    return claims
+
+
+def bearer_token(header):
+
+    if header and header.startswith("Bearer "):
+        return header[len("Bearer "):].strip()
+
+    return None
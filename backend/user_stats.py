@@ -0,0 +1,103 @@
+import sys
+from pymongo import UpdateOne
+from db import interactions_col, user_stats_col
+
+
+def stats_updates(docs):
+
+    # Fold a batch into one $inc per user so a flush of many events costs
+    # one bulk_write, not one update per event.
+    updates = {}
+
+    for doc in docs:
+
+        user_id = doc.get("user_id")
+
+        if user_id is None:
+            continue
+
+        update = updates.setdefault(user_id, {"inc": {}, "last_seen": None})
+        inc = update["inc"]
+
+        inc["total"] = inc.get("total", 0) + 1
+
+        action = doc.get("action")
+
+        # Used as a field name below; anything that could nest or start
+        # an operator is left out of the per-action counts.
+        if isinstance(action, str) and action.isalpha():
+            action = f"actions.{action}"
+            inc[action] = inc.get(action, 0) + 1
+
+        if doc.get("action") == "book" and doc.get("car_id") is not None:
+            booking = f"bookings.{doc['car_id']}"
+            inc[booking] = inc.get(booking, 0) + 1
+
+        ts = doc.get("timestamp")
+
+        if ts is not None and (update["last_seen"] is None or ts > update["last_seen"]):
+            update["last_seen"] = ts
+
+    ops = []
+
+    for user_id, update in updates.items():
+
+        change = {"$inc": update["inc"]}
+
+        if update["last_seen"] is not None:
+            change["$max"] = {"last_seen": update["last_seen"]}
+
+        ops.append(UpdateOne({"_id": user_id}, change, upsert=True))
+
+    return ops
+
+
+def record_interactions(docs, collection=user_stats_col):
+
+    ops = stats_updates(docs)
+
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+
+def get_user_stats(user_id, collection=user_stats_col):
+
+    return collection.find_one({"_id": user_id}) or {}
+
+
+def rebuild_user_stats(collection=user_stats_col, source=interactions_col):
+
+    # Backfill from the raw interactions, e.g. for data written before the
+    # counters existed. The new counters are built in a side collection and
+    # renamed over the live one, so readers never see them half-built.
+    # Events stored while this runs may land in the old collection only and
+    # be lost in the swap: stop the backend workers for an exact rebuild.
+    rebuilt = collection.database[collection.name + "_rebuild"]
+    rebuilt.drop()
+
+    batch = []
+
+    for doc in source.find({}, {"_id": 0, "user_id": 1, "car_id": 1, "action": 1, "timestamp": 1}):
+
+        batch.append(doc)
+
+        if len(batch) >= 5000:
+            record_interactions(batch, rebuilt)
+            batch = []
+
+    record_interactions(batch, rebuilt)
+
+    # A source with no interactions at all leaves nothing to rename.
+    if rebuilt.name not in collection.database.list_collection_names():
+        collection.delete_many({})
+        return
+
+    rebuilt.rename(collection.name, dropTarget=True)
+
+
+if __name__ == "__main__":
+
+    # Run with the backend stopped; see rebuild_user_stats.
+    if "--rebuild" in sys.argv:
+        rebuild_user_stats()
+        print("user_stats rebuilt")
@@ -98,6 +98,9 @@ color:#111;
 if "user" not in st.session_state:
     st.session_state["user"] = None
 
+if "token" not in st.session_state:
+    st.session_state["token"] = None
+
 if "page" not in st.session_state:
     st.session_state["page"] = "home"
 
@@ -113,26 +116,112 @@ if "selected_car" not in st.session_state:
 if "booking_success" not in st.session_state:
     st.session_state["booking_success"] = False
 
+if "cars_cache" not in st.session_state:
+    st.session_state["cars_cache"] = {}
 
 
-def safe_post(url, payload):
+
+def auth_headers():
+
+    # Signed session token from /api/login; the backend answers 401 to
+    # user routes without it.
+    token = st.session_state.get("token")
+
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def end_session():
+
+    # The backend rejected our token (expired, or signed with a key it no
+    # longer has). Nothing user-scoped works without one, so sign out and
+    # ask for a fresh login instead.
+    st.session_state["user"] = None
+    st.session_state["token"] = None
+    st.session_state["session_expired"] = True
+    st.session_state["page"] = "login"
+    st.rerun()
+
+
+def post_json(url, payload):
+
+    # (status, body); both None when the backend cannot be reached.
     try:
-        r = requests.post(url, json=payload)
-        if r.status_code == 200:
-            return r.json()
+        r = requests.post(url, json=payload, headers=auth_headers())
+        return r.status_code, r.json()
     except:
-        pass
-    return None
+        return None, None
+
+
+def get_json(url):
+
+    try:
+        r = requests.get(url, headers=auth_headers())
+        return r.status_code, r.json()
+    except:
+        return None, None
+
+
+def safe_post(url, payload):
+    status, data = post_json(url, payload)
+    if status == 401:
+        end_session()
+    return data if status == 200 else None
 
 
 def safe_get(url):
+    status, data = get_json(url)
+    if status == 401:
+        end_session()
+    return data if status == 200 else None
+
+
+
+def cached_get(url):
+
+    cache = st.session_state["cars_cache"]
+    cached = cache.get(url)
+
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+
     try:
-        r = requests.get(url)
+        r = requests.get(url, headers=headers)
+        if r.status_code == 304 and cached:
+            return cached["data"]
         if r.status_code == 200:
-            return r.json()
+            data = r.json()
+            cache[url] = {"etag": r.headers.get("ETag"), "data": data}
+            return data
     except:
         pass
-    return None
+
+    return cached["data"] if cached else None
+
+
+def get_cars():
+
+    # Only the fields the dashboard and payment page render.
+    url = (
+        f"{BACKEND_URL}/api/cars?limit=500"
+        f"&fields=_id,Brand,Model,Fuel_Type,Body_Type,Engine_CC,Mileage,Year"
+    )
+
+    cars = []
+    after = None
+
+    while True:
+
+        page = cached_get(url + (f"&after={after}" if after else ""))
+
+        if page is None:
+            return cars if cars else None
+
+        cars.extend(page.get("cars", []))
+        after = page.get("next")
+
+        if not after:
+            return cars
 
 
 
@@ -141,17 +230,17 @@ def log_interaction(car_id, action):
     if st.session_state["user"] is None:
         return
 
-    try:
-        requests.post(
-            f"{BACKEND_URL}/api/interact",
-            json={
-                "user_id": st.session_state["user"]["_id"],
-                "car_id": car_id,
-                "action": action
-            }
-        )
-    except:
-        pass
+    status, _ = post_json(
+        f"{BACKEND_URL}/api/interact",
+        {
+            "user_id": st.session_state["user"]["_id"],
+            "car_id": car_id,
+            "action": action
+        }
+    )
+
+    if status == 401:
+        end_session()
 
 
 
@@ -189,6 +278,7 @@ with st.sidebar:
 
         if st.button("Logout"):
             st.session_state["user"] = None
+            st.session_state["token"] = None
             st.session_state["recommended_cars"] = []
             st.session_state["cf_cars"] = []
             st.session_state["page"] = "home"
@@ -300,6 +390,9 @@ def login_page():
     st.markdown("<h1 style='text-align: center;'>Login / Sign Up</h1>", unsafe_allow_html=True)
     st.write("")
 
+    if st.session_state.pop("session_expired", False):
+        st.warning("Your session has expired. Please log in again.")
+
     col1, col2, col3 = st.columns([1, 2, 1])
 
     with col2:
@@ -315,15 +408,20 @@ def login_page():
 
                 if st.button("Login"):
 
-                    user = safe_post(
+                    status, user = post_json(
                         f"{BACKEND_URL}/api/login",
                         {"email": email, "password": password}
                     )
 
-                    if user and "user" in user:
+                    if status == 200 and user and "user" in user:
                         st.session_state["user"] = user["user"]
+                        st.session_state["token"] = user.get("token")
                         st.session_state["page"] = "preferences"
                         st.rerun()
+                    elif status in (429, 503):
+                        # Rate limited or the password workers are busy;
+                        # the credentials were never checked.
+                        st.error((user or {}).get("error") or "Server busy, try again shortly")
                     else:
                         st.error("Invalid credentials")
 
@@ -337,7 +435,7 @@ def login_page():
 
                 if st.button("Sign Up"):
 
-                    r = safe_post(
+                    status, r = post_json(
                         f"{BACKEND_URL}/api/signup",
                         {
                             "name": name,
@@ -347,8 +445,10 @@ def login_page():
                         }
                     )
 
-                    if r and r.get("success"):
+                    if status == 200 and r and r.get("success"):
                         st.success("Account created successfully. Please login.")
+                    elif status in (429, 503):
+                        st.error((r or {}).get("error") or "Server busy, try again shortly")
 
 
 
@@ -398,6 +498,9 @@ def preferences_page():
                     st.session_state["recommended_cars"] = rec.get("cbf",[])
                     st.session_state["cf_cars"] = rec.get("cf",[])
 
+                    if rec.get("token"):
+                        st.session_state["token"] = rec["token"]
+
                     st.session_state["page"] = "book"
                     st.rerun()
 
@@ -407,7 +510,7 @@ def book_page():
 
     st.markdown("<h1 style='text-align: center; margin-bottom: 20px;'>Dashboard</h1>", unsafe_allow_html=True)
 
-    cars = safe_get(f"{BACKEND_URL}/api/cars")
+    cars = get_cars()
 
     with st.container(border=True):
         st.markdown("Search Cars")
@@ -570,32 +673,31 @@ def payment_page():
 
                 car_id = car.get("_id") or car.get("Car_ID")
 
-                try:
-
-                    response = requests.post(
-                        f"{BACKEND_URL}/api/book",
-                        json={
-                            "user_id": st.session_state["user"]["_id"],
-                            "car_id": car_id
-                        }
-                    )
+                status, data = post_json(
+                    f"{BACKEND_URL}/api/book",
+                    {
+                        "user_id": st.session_state["user"]["_id"],
+                        "car_id": car_id
+                    }
+                )
 
-                    data = response.json()
+                if status == 401:
+                    end_session()
 
-                    if data.get("success"):
+                if status == 200 and data and data.get("success"):
 
-                        st.success("Car booked successfully. It will be delivered to your location.")
+                    st.success("Car booked successfully. It will be delivered to your location.")
 
-                        st.session_state["booking_success"] = True
-                        st.session_state["page"] = "confirmation"
+                    st.session_state["booking_success"] = True
+                    st.session_state["page"] = "confirmation"
 
-                        st.rerun()
+                    st.rerun()
 
-                    else:
-                        st.error("Booking failed")
+                elif status is None:
+                    st.error("Could not reach the booking service")
 
-                except Exception as e:
-                    st.error(f"Error: {e}")
+                else:
+                    st.error("Booking failed")
 
 
 def confirmation_page():